@@ -15,10 +15,29 @@ CONFIG_LOAD_FILE = "random_configs.json"
 MAX_CPU_WORKERS = 16
 MAX_TIME_PER_RUN_SECONDS = None
 ABSOLUTE_GAP_LIMIT = 0.99
+# 最後に目的値が改善してからこの秒数が経過したら探索を打ち切る (None で無効)
+PLATEAU_TIMEOUT_SECONDS = None
+# 'auto_permutations' モードで同時に解く順列シナリオ数 (プロセス数)。None または 1 で逐次実行
+# (MAX_CPU_WORKERS はプロセス間で等分される)
+PERMUTATION_PARALLEL_RUNS = None
+# 'auto_permutations' モードで、比率が同一のターゲット同士の因数順列の割り当てを入れ替えただけの
+# 組み合わせを1つにまとめる。ターゲット番号に依存する役割ベースのプルーニングが無効な場合のみ適用される
+# (その場合はターゲットの並べ替えで問題が変わらず、同じ最適値になるため)
+PERMUTATION_SKIP_EQUIVALENT_TARGETS = False
 MAX_SHARING_VOLUME = None
 MAX_LEVEL_DIFF = None
 MAX_MIXER_SIZE = 5
 
+# 濃度制約の積 (共有量 x 比率) を、共有量の値リテラルで条件付けた線形制約に置き換える
+# False の場合は AddMultiplicationEquality を使用する
+# トレードオフ: waste モードでは良い解に届きやすい (比率合計54の3ターゲット例で 廃棄 3 vs 4) が、
+# operations モードは証明が遅くなる (同例で約 22 秒 vs 13 秒) ため既定では無効
+ENABLE_PRODUCT_CHANNELING = False
+
+# 入れ替え可能な兄弟ノード (P値・供給元・供給先が同一) に順序制約を課して対称解を除去する
+# (CP-SAT 自身の対称性検出と競合して遅くなるケースがあるため既定では無効)
+ENABLE_SYMMETRY_BREAKING = False
+
 # [NEW] 役割ベースのプルーニング設定
 ENABLE_ROLE_BASED_PRUNING = True
 
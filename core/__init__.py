@@ -1,12 +1,12 @@
 # core/__init__.py
-from core.algorithm.dfmm import build_dfmm_forest, calculate_p_values_from_structure, find_factors_for_sum, generate_unique_permutations, apply_auto_factors
+from core.algorithm.dfmm import build_dfmm_forest, calculate_p_values_from_structure, build_dfmm_structures, find_factors_for_sum, generate_unique_permutations, apply_auto_factors
 from core.model.problem import MTWMProblem
 from core.solver.engine import OrToolsSolver
 from core.solver.solution import OrToolsSolutionModel 
 from core.execution import ExecutionEngine
 
 __all__ = [
-    "build_dfmm_forest", "calculate_p_values_from_structure", "find_factors_for_sum", "generate_unique_permutations", "apply_auto_factors",
+    "build_dfmm_forest", "calculate_p_values_from_structure", "build_dfmm_structures", "find_factors_for_sum", "generate_unique_permutations", "apply_auto_factors",
     "MTWMProblem",
     "OrToolsSolver",
     "OrToolsSolutionModel",
@@ -1,27 +1,58 @@
 # core/algorithm/dfmm.py
-import math
-import itertools
-from functools import reduce
-import operator
+from functools import lru_cache
+from math import prod
 
 def find_factors_for_sum(ratio_sum, max_factor):
-    if ratio_sum <= 1: return []
+    # 同じ比率和は複数ターゲット・複数シナリオで繰り返し現れるため、結果はキャッシュする
+    # (呼び出し側が変更しても影響しないよう、毎回新しいリストを返す)
+    factors = _find_factors_cached(ratio_sum, max_factor)
+    return None if factors is None else list(factors)
+
+@lru_cache(maxsize=None)
+def _find_factors_cached(ratio_sum, max_factor):
+    if ratio_sum <= 1: return ()
     n, factors = ratio_sum, []
+    # n の max_factor 以下の最大の約数 d で割った後、n // d が d より大きい約数を持つことはない
+    # (持てば n の約数でもあり、d の最大性に反する)。したがって探索は前回の d から再開してよい。
+    d = max_factor
     while n > 1:
-        found_divisor = False
-        for d in range(max_factor, 1, -1):
-            if n % d == 0:
-                factors.append(d)
-                n //= d
-                found_divisor = True
-                break
-        if not found_divisor:
+        while d > 1 and n % d != 0:
+            d -= 1
+        if d <= 1:
             return None
-    return sorted(factors, reverse=True)
+        factors.append(d)
+        n //= d
+    return tuple(factors)
 
 def generate_unique_permutations(factors):
     if not factors: return [()]
-    return list(set(itertools.permutations(factors)))
+    return list(_unique_permutations_cached(tuple(factors)))
+
+@lru_cache(maxsize=None)
+def _unique_permutations_cached(factors):
+    return tuple(_iter_multiset_permutations(factors))
+
+def _iter_multiset_permutations(items):
+    """
+    重複を含む列の相異なる順列を辞書順に生成する (Narayana の next permutation)。
+    itertools.permutations と違い、重複順列を作ってから捨てることはない。
+    """
+    seq = sorted(items)
+    n = len(seq)
+    while True:
+        yield tuple(seq)
+        # 末尾から見て初めて昇順になっている位置 i を探す
+        i = n - 2
+        while i >= 0 and seq[i] >= seq[i + 1]:
+            i -= 1
+        if i < 0:
+            return
+        # seq[i] より大きい最も右の要素と交換し、後半を反転する
+        j = n - 1
+        while seq[j] <= seq[i]:
+            j -= 1
+        seq[i], seq[j] = seq[j], seq[i]
+        seq[i + 1:] = reversed(seq[i + 1:])
 
 def build_dfmm_forest(targets_config):
     forest_structure = []
@@ -34,10 +65,14 @@ def build_dfmm_forest(targets_config):
 
         for l in range(num_levels - 1, -1, -1):
             factor = factors[l]
-            level_remainders = [v % factor for v in values_to_process]
-            level_quotients = [v // factor for v in values_to_process]
+            # 商と余りを divmod で一度に求め、ノード数の切り上げも整数演算で行う
+            level_quotients, level_remainders = [], []
+            for v in values_to_process:
+                q, r = divmod(v, factor)
+                level_quotients.append(q)
+                level_remainders.append(r)
             total_inputs = sum(level_remainders) + len(nodes_from_below_ids)
-            num_nodes_at_level = math.ceil(total_inputs / factor) if total_inputs > 0 else 0
+            num_nodes_at_level = -(-total_inputs // factor) if total_inputs > 0 else 0
             current_level_node_ids = [(l, k) for k in range(num_nodes_at_level)]
 
             for node_id in current_level_node_ids:
@@ -58,20 +93,31 @@ def build_dfmm_forest(targets_config):
 def calculate_p_values_from_structure(forest_structure, targets_config):
     p_forest = []
     for m, tree_structure in enumerate(forest_structure):
-        factors, memo, p_tree = targets_config[m]['factors'], {}, {}
-        def prod(iterable): return reduce(operator.mul, iterable, 1)
-        def get_p_for_node(node_id):
-            if node_id in memo: return memo[node_id]
-            level, k = node_id
-            children = tree_structure.get(node_id, {}).get('children', [])
-            if not children: p = prod(factors[level:])
-            else: p = max(get_p_for_node(child_id) for child_id in children) * factors[level]
-            memo[node_id] = p
-            return p
-        for node_id in tree_structure: p_tree[node_id] = get_p_for_node(node_id)
-        p_forest.append(p_tree)
+        factors = targets_config[m]['factors']
+        num_levels = len(factors)
+        # 葉ノードの P 値 = factors[level:] の積 (レベルごとに一度だけ計算する)
+        leaf_p = [prod(factors[level:]) for level in range(num_levels)]
+        # 子は常に親より深いレベルにあるため、深いレベルから順に処理すれば再帰は不要
+        computed = {}
+        for node_id in sorted(tree_structure, key=lambda node: node[0], reverse=True):
+            level = node_id[0]
+            children = tree_structure[node_id].get('children', [])
+            if not children:
+                computed[node_id] = leaf_p[level]
+            else:
+                computed[node_id] = max(
+                    computed.get(child_id, leaf_p[child_id[0]]) for child_id in children
+                ) * factors[level]
+        # 辞書の並びは従来どおり tree_structure の順序に揃える
+        p_forest.append({node_id: computed[node_id] for node_id in tree_structure})
     return p_forest
 
+def build_dfmm_structures(targets_config):
+    """DFMMツリー構造とP値をまとめて構築する (各エントリポイント共通の前処理)"""
+    tree_structures = build_dfmm_forest(targets_config)
+    p_values = calculate_p_values_from_structure(tree_structures, targets_config)
+    return tree_structures, p_values
+
 def apply_auto_factors(targets_config, max_mixer_size):
     """[NEW] StandardRunnerから移動したロジック"""
     for target in targets_config:
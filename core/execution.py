@@ -1,6 +1,6 @@
 # core/execution.py
 import os
-from core.algorithm.dfmm import build_dfmm_forest, calculate_p_values_from_structure
+from core.algorithm.dfmm import build_dfmm_structures
 from core.model.problem import MTWMProblem
 from core.solver.engine import OrToolsSolver
 from reporting.analyzer import PreRunAnalyzer
@@ -29,8 +29,7 @@ class ExecutionEngine:
         print("-" * 35 + "\n")
 
         # 1. DFMMアルゴリズムでツリー構造とP値を計算
-        tree_structures = build_dfmm_forest(targets_config)
-        p_values = calculate_p_values_from_structure(tree_structures, targets_config)
+        tree_structures, p_values = build_dfmm_structures(targets_config)
         
         # 2. 最適化問題オブジェクトを生成
         problem = MTWMProblem(targets_config, tree_structures, p_values)
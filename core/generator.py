@@ -1,6 +1,6 @@
 import random
 import itertools
-import copy
+from math import comb
 from core.algorithm.dfmm import find_factors_for_sum, generate_unique_permutations
 from core.algorithm.math_utils import generate_random_ratios
 
@@ -53,20 +53,63 @@ class PermutationScenarioGenerator:
         self.config = config
 
     def generate_permutations(self, base_config):
+        return list(self.iter_permutations(base_config))
+
+    def count_permutations(self, base_config):
+        """全組み合わせを生成せずに、シナリオ数を返す"""
+        target_perms_options = self._permutation_options(base_config)
+        total = 1
+        for positions in self._equivalent_target_groups(base_config):
+            # 同値なターゲット群 (s 個) には、順列 n 通りから重複を許して s 個選ぶ組み合わせだけが残る
+            total *= comb(len(target_perms_options[positions[0]]) + len(positions) - 1, len(positions))
+        return total
+
+    def iter_permutations(self, base_config):
+        """
+        因数順列の組み合わせシナリオを1つずつ生成する。
+        直積をリスト化しないため、組み合わせ数が膨大でもメモリ使用量は一定。
+        """
+        target_perms_options = self._permutation_options(base_config)
+        # 同値なターゲット群の中では、割り当てる順列が位置順に非減少のものだけを代表として残す
+        # (入れ替えただけの組み合わせは必ずちょうど1つの代表を持つため、既出集合は不要)
+        groups = [g for g in self._equivalent_target_groups(base_config) if len(g) > 1]
+        run_idx = 0
+        for combo in itertools.product(*target_perms_options):
+            if any(
+                combo[a] > combo[b]
+                for positions in groups
+                for a, b in zip(positions, positions[1:])
+            ):
+                continue
+            run_idx += 1
+            # 書き換えるのは 'factors' だけなので、ターゲット辞書の浅いコピーで十分
+            # ('ratios' などは下流で変更されないため、元の設定と共有する)
+            temp_config = [
+                {**target, 'factors': list(factors)}
+                for target, factors in zip(base_config, combo)
+            ]
+            name_parts = ["_".join(map(str, factors)) for factors in combo]
+            
+            run_name = f"run_{run_idx}_{'-'.join(name_parts)}"
+            yield {'run_name': run_name, 'targets': temp_config}
+
+    def _equivalent_target_groups(self, base_config):
+        """
+        入れ替えても同じ問題になるターゲットの位置をまとめたリストを返す (各グループは位置の昇順)。
+        PERMUTATION_SKIP_EQUIVALENT_TARGETS が無効、またはターゲット番号に依存する
+        役割ベースのプルーニングが有効な場合は、各ターゲットが単独のグループになる。
+        """
+        if not self.config.PERMUTATION_SKIP_EQUIVALENT_TARGETS or self.config.ENABLE_ROLE_BASED_PRUNING:
+            return [[j] for j in range(len(base_config))]
+        groups = {}
+        for j, target in enumerate(base_config):
+            groups.setdefault(tuple(target['ratios']), []).append(j)
+        return list(groups.values())
+
+    def _permutation_options(self, base_config):
         target_perms_options = []
         for target in base_config:
             base_factors = find_factors_for_sum(sum(target['ratios']), self.config.MAX_MIXER_SIZE)
             if not base_factors: raise ValueError(f"No factors for {target['name']}")
             target_perms_options.append(generate_unique_permutations(base_factors))
-
-        scenarios = []
-        for i, combo in enumerate(itertools.product(*target_perms_options)):
-            temp_config = copy.deepcopy(base_config)
-            name_parts = []
-            for j, target in enumerate(temp_config):
-                target['factors'] = list(combo[j])
-                name_parts.append("_".join(map(str, combo[j])))
-            
-            run_name = f"run_{i+1}_{'-'.join(name_parts)}"
-            scenarios.append({'run_name': run_name, 'targets': temp_config})
-        return scenarios
\ No newline at end of file
+        return target_perms_options
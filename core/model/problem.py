@@ -1,6 +1,37 @@
-import itertools
+from functools import cached_property
+from operator import itemgetter
+from array import array
+from bisect import bisect_right
+from types import MappingProxyType
 from utils.config_loader import Config
 
+# 役割ベースの接続フィルタリングで用いる Role ((k + m) % 3) の集合
+ALL_ROLES = frozenset({0, 1, 2})
+NO_ROLES = frozenset()
+
+# 共有候補を持たないノードに割り当てる空の共有変数マッピング (全ノードで共有するため読み取り専用)
+EMPTY_SHARING_VARS = MappingProxyType({})
+
+class NodeDef:
+    """
+    forest の各ノードが持つ変数名の定義。
+    ノード数ぶん生成されるため、dict ではなく __slots__ を持つクラスにしてメモリを抑える。
+    共有変数名は候補エッジを持つノードにだけ _define_sharing_variables で割り当てる
+    (それ以外のノードは読み取り専用の空マッピングを共有する)。
+    """
+    __slots__ = (
+        "node_name", "ratio_vars", "reagent_vars", "total_input_var_name",
+        "intra_sharing_vars", "inter_sharing_vars",
+    )
+
+    def __init__(self, node_name, ratio_vars, reagent_vars, total_input_var_name):
+        self.node_name = node_name
+        self.ratio_vars = ratio_vars
+        self.reagent_vars = reagent_vars
+        self.total_input_var_name = total_input_var_name
+        self.intra_sharing_vars = EMPTY_SHARING_VARS
+        self.inter_sharing_vars = EMPTY_SHARING_VARS
+
 class MTWMProblem:
     def __init__(self, targets_config, tree_structures, p_values):
         self.targets_config = targets_config
@@ -9,127 +40,234 @@ class MTWMProblem:
         self.p_values = p_values
         self.forest = self._define_base_variables()
         self.potential_sources_map = self._precompute_potential_sources()
+        self._index_edges()
         self._define_sharing_variables()
 
     def _define_base_variables(self):
         forest = []
+        # 試薬ごとの変数名の接尾辞はノードによらないため、一度だけ作っておく
+        reagent_suffixes = [f"_t{t}" for t in range(self.num_reagents)]
         for m, tree_structure in enumerate(self.tree_structures):
             tree_data = {}
-            levels = sorted({l for l, k in tree_structure.keys()})
-            for l in levels:
-                nodes_at_level = sorted([k for l_node, k in tree_structure.keys() if l_node == l])
-                level_nodes = [
-                    {
-                        'node_name': f"v_m{m}_l{l}_k{k}",
-                        'ratio_vars': [f"R_m{m}_l{l}_k{k}_t{t}" for t in range(self.num_reagents)],
-                        'reagent_vars': [f"r_m{m}_l{l}_k{k}_t{t}" for t in range(self.num_reagents)],
-                        'total_input_var_name': f"TotalInput_m{m}_l{l}_k{k}",
-                        'waste_var_name': f"waste_m{m}_l{l}_k{k}" if l > 0 else None
-                    }
-                    for k in nodes_at_level
-                ]
+            # 一度の走査でノードをレベルごとに振り分ける
+            nodes_by_level = {}
+            for l, k in tree_structure:
+                nodes_by_level.setdefault(l, []).append(k)
+            for l in sorted(nodes_by_level):
+                level_nodes = []
+                for k in sorted(nodes_by_level[l]):
+                    # ノード座標部分はノードごとに一度だけフォーマットし、各変数名で使い回す
+                    node_id = f"m{m}_l{l}_k{k}"
+                    level_nodes.append(NodeDef(
+                        node_name="v_" + node_id,
+                        ratio_vars=["R_" + node_id + suffix for suffix in reagent_suffixes],
+                        reagent_vars=["r_" + node_id + suffix for suffix in reagent_suffixes],
+                        total_input_var_name="TotalInput_" + node_id,
+                    ))
                 tree_data[l] = level_nodes
             forest.append(tree_data)
         return forest
 
     def _precompute_potential_sources(self):
+        """
+        各供給先ノードについて、接続候補となる供給元ノードのリストを求める。
+        全ノード対 (N^2) を走査する代わりに、供給元を (ターゲット, レベル) ごとに
+        「P値 -> ノード番号リスト」としてまとめておき、供給先ごとに
+        許容レベルかつ P値が割り切れるバケットだけを取り出す (バケット結合)。
+        返す辞書のキー順・供給元の並びは全ノード対走査と同じ (m, l, k) 順。
+        """
         source_map = {}
-        all_nodes = [(m, l, k) for m, tree in enumerate(self.forest) for l, nodes in tree.items() for k in range(len(nodes))]
+        max_level_diff = Config.MAX_LEVEL_DIFF
+        role_based_pruning = Config.ENABLE_ROLE_BASED_PRUNING
 
-        for (m_dst, l_dst, k_dst), (m_src, l_src, k_src) in itertools.product(all_nodes, repeat=2):
-            # 1. 物理的制約チェック
-            if l_src <= l_dst: continue
-            if Config.MAX_LEVEL_DIFF is not None and l_src > l_dst + Config.MAX_LEVEL_DIFF: continue
+        # 供給元バケット: src_buckets[m] = [(level, {p_src: [k, ...]}, {q_dst: [k, ...]}), ...] (レベル昇順)
+        # 3番目の辞書は「q_dst を割り切るノード番号リスト」のメモで、同じ q_dst を持つ供給先で使い回す
+        # src_levels[m] はそのレベル列で、許容レベル範囲を二分探索で切り出すのに使う
+        src_buckets = []
+        src_levels = []
+        for m, tree in enumerate(self.forest):
+            p_tree = self.p_values[m]
+            levels = []
+            for l, nodes in tree.items():
+                by_p = {}
+                for k in range(len(nodes)):
+                    by_p.setdefault(p_tree[(l, k)], []).append(k)
+                levels.append((l, by_p, {}))
+            src_buckets.append(levels)
+            src_levels.append([l for l, _, _ in levels])
 
-            # 2. 濃度整合性チェック
-            p_dst = self.p_values[m_dst][(l_dst, k_dst)]
-            f_dst = self.targets_config[m_dst]['factors'][l_dst]
-            p_src = self.p_values[m_src][(l_src, k_src)]
-            
-            if (p_dst // f_dst) % p_src != 0: continue
+        for m_dst, tree_dst in enumerate(self.forest):
+            p_tree_dst = self.p_values[m_dst]
+            factors_dst = self.targets_config[m_dst]['factors']
+            structure_dst = self.tree_structures[m_dst]
 
-            # 3. 親子関係（Default Edge）の確認
-            # 親子関係にある場合は、設定に関わらず必ず接続を許可する
-            is_default_edge = False
-            if m_src == m_dst:
-                dst_node_data = self.tree_structures[m_dst].get((l_dst, k_dst))
-                if dst_node_data and (l_src, k_src) in dst_node_data['children']:
-                    is_default_edge = True
-
-            # -----------------------------------------------------------------
-            # [NEW] 役割ベースの接続フィルタリング (Role-Based Pruning)
-            # -----------------------------------------------------------------
-            if Config.ENABLE_ROLE_BASED_PRUNING and not is_default_edge:
-                is_allowed = False
-                
-                # --- A. 同じターゲット内 (Intra) ---
-                # ここは従来通り Role (0, 1) で厳しく間引く
-                if m_src == m_dst:
-                    role_id = (k_src + m_src) % 3
-                    
-                    # Role 0: 近距離サポーター
-                    if role_id == 0:
-                        if (l_src - l_dst) == 1: is_allowed = True
-                    # Role 1: 遠距離サポーター
-                    elif role_id == 1:
-                        if (l_src - l_dst) > 1: is_allowed = True
-                    # Role 2 は Intra に貢献しない (Export専用)
-
-                # --- B. 異なるターゲット間 (Inter) ---
-                else:
-                    mode = Config.INTER_SHARING_MODE
-                    
-                    if mode == 'ring':
-                        # 【リングモード】(Role制限なし)
-                        # 次のターゲットであれば、どのノードからでも接続を許可する
-                        # これにより「最後→最初」の接続漏れを防ぐ
-                        num_targets = len(self.targets_config)
-                        if m_dst == (m_src + 1) % num_targets:
-                            is_allowed = True
-                            
-                    elif mode == 'linear':
-                        # 【リニアモード】(Role制限なし)
-                        # 次のターゲットであれば許可
-                        if m_dst == m_src + 1:
-                            is_allowed = True
-                            
-                    else:
-                        # 【Allモード】(Role制限あり)
-                        # 全結合だと多すぎるので、Role 2 (輸出担当) だけに限定する
-                        role_id = (k_src + m_src) % 3
-                        if role_id == 2:
-                            is_allowed = True
-
-                # 許可されなかったエッジはスキップ
-                if not is_allowed:
-                    continue
-            # -----------------------------------------------------------------
-
-            # マップに登録
-            key = (m_dst, l_dst, k_dst)
-            if key not in source_map: source_map[key] = []
-            source_map[key].append((m_src, l_src, k_src))
+            for l_dst, nodes_dst in tree_dst.items():
+                f_dst = factors_dst[l_dst]
+                for k_dst in range(len(nodes_dst)):
+                    # 2. 濃度整合性チェック用の値 (供給先ごとに一度だけ計算)
+                    q_dst = p_tree_dst[(l_dst, k_dst)] // f_dst
+                    dst_node_data = structure_dst.get((l_dst, k_dst))
+                    children = dst_node_data['children'] if dst_node_data else ()
+
+                    sources = []
+                    for m_src, buckets in enumerate(src_buckets):
+                        # 1. 物理的制約チェック: 許容レベル (l_dst, l_dst + MAX_LEVEL_DIFF] のバケットだけを切り出す
+                        levels = src_levels[m_src]
+                        start = bisect_right(levels, l_dst)
+                        stop = len(levels) if max_level_diff is None else bisect_right(levels, l_dst + max_level_diff)
+                        for l_src, by_p, admitted in buckets[start:stop]:
+                            # 役割ベースの間引きで許可される Role (バケット単位で決まる)
+                            allowed_roles = (
+                                self._allowed_roles(m_src, m_dst, l_src - l_dst)
+                                if role_based_pruning else ALL_ROLES
+                            )
+                            # 共有が一切許可されず、親子関係もあり得ない (別ターゲット) バケットは丸ごと除外
+                            if not allowed_roles and m_src != m_dst: continue
+
+                            # 2. 濃度整合性チェック: P値が割り切れるバケットのノードのみ
+                            # (判定結果は q_dst ごとにメモし、同じ q_dst の供給先では再計算しない)
+                            k_candidates = admitted.get(q_dst)
+                            if k_candidates is None:
+                                k_candidates = [k for p_src, ks in by_p.items() if q_dst % p_src == 0 for k in ks]
+                                if len(by_p) > 1:
+                                    k_candidates.sort()
+                                admitted[q_dst] = k_candidates
+
+                            if allowed_roles is ALL_ROLES:
+                                sources.extend([(m_src, l_src, k_src) for k_src in k_candidates])
+                                continue
+
+                            for k_src in k_candidates:
+                                # 3. 親子関係（Default Edge）の確認
+                                # 親子関係にある場合は、設定に関わらず必ず接続を許可する
+                                if (k_src + m_src) % 3 in allowed_roles or (
+                                    m_src == m_dst and (l_src, k_src) in children
+                                ):
+                                    sources.append((m_src, l_src, k_src))
+
+                    # マップに登録
+                    if sources:
+                        source_map[(m_dst, l_dst, k_dst)] = sources
             
         return source_map
 
-    def _create_sharing_vars_for_node(self, m_dst, l_dst, k_dst):
-        potential_sources = self.potential_sources_map.get((m_dst, l_dst, k_dst), [])
+    def _allowed_roles(self, m_src, m_dst, level_diff):
+        """
+        [NEW] 役割ベースの接続フィルタリング (Role-Based Pruning)
+        供給元 (m_src) から供給先 (m_dst, レベル差 level_diff) への共有エッジについて、
+        許可される供給元の Role ((k_src + m_src) % 3) の集合を返す。
+        親子関係 (Default Edge) はこの判定に関わらず常に許可される。
+        """
+        # --- A. 同じターゲット内 (Intra) ---
+        # ここは従来通り Role (0, 1) で厳しく間引く
+        if m_src == m_dst:
+            # Role 0: 近距離サポーター
+            if level_diff == 1:
+                return frozenset({0})
+            # Role 1: 遠距離サポーター
+            # Role 2 は Intra に貢献しない (Export専用)
+            return frozenset({1})
+
+        # --- B. 異なるターゲット間 (Inter) ---
+        mode = Config.INTER_SHARING_MODE
+        
+        if mode == 'ring':
+            # 【リングモード】(Role制限なし)
+            # 次のターゲットであれば、どのノードからでも接続を許可する
+            # これにより「最後→最初」の接続漏れを防ぐ
+            num_targets = len(self.targets_config)
+            return ALL_ROLES if m_dst == (m_src + 1) % num_targets else NO_ROLES
+                
+        elif mode == 'linear':
+            # 【リニアモード】(Role制限なし)
+            # 次のターゲットであれば許可
+            return ALL_ROLES if m_dst == m_src + 1 else NO_ROLES
+                
+        else:
+            # 【Allモード】(Role制限あり)
+            # 全結合だと多すぎるので、Role 2 (輸出担当) だけに限定する
+            return frozenset({2})
+
+    def _index_edges(self):
+        """
+        各ノード (m, l, k) に連番IDを振り、候補エッジを (供給先ID, 供給元ID) の
+        並列 int 配列として保持する (タプルのリストより省メモリで、件数集計も高速)。
+        ノード属性 (P値) も同じIDで引ける配列として持つ。
+        """
+        self.id_to_key = [
+            (m, l, k)
+            for m, tree in enumerate(self.forest)
+            for l in sorted(tree)
+            for k in range(len(tree[l]))
+        ]
+        self.key_to_id = {key: i for i, key in enumerate(self.id_to_key)}
+        # ノードIDで引ける P 値 (p_values[m][(l, k)] の平坦化)
+        p_values = self.p_values
+        self.p_by_id = array('i', [p_values[m][(l, k)] for m, l, k in self.id_to_key])
+
+        key_to_id = self.key_to_id
+        self.edges_dst = array('i')
+        self.edges_src = array('i')
+        for dst_key, sources in self.potential_sources_map.items():
+            self.edges_dst.extend([key_to_id[dst_key]] * len(sources))
+            self.edges_src.extend(map(key_to_id.__getitem__, sources))
+
+    @cached_property
+    def default_connections(self):
+        """
+        必須接続 (DFMMの親子関係) を「供給先 (m, l, k) -> 子ノード (m, l, k) の frozenset」として返す。
+        初回参照時に一度だけ構築し、エッジ解析・可視化で共有する。
+        """
+        default_src_by_dst = {}
+        for m, tree in enumerate(self.tree_structures):
+            for (p_lvl, p_idx), data in tree.items():
+                children = data['children']
+                if children:
+                    default_src_by_dst[(m, p_lvl, p_idx)] = frozenset(
+                        (m, c_lvl, c_idx) for (c_lvl, c_idx) in children
+                    )
+        return default_src_by_dst
+
+    def count_edge_classes(self):
+        """
+        候補エッジを (必須DFMM, Intra共有, Inter共有) の3種に分類して件数を返す。
+        供給先ごとに map / count で一括集計し、エッジ単位の Python 分岐を避ける
+        (デフォルト供給元は常に同一ツリーの子ノードなので、Intra = 同一ツリー - デフォルト)。
+        """
+        default_src_by_dst = self.default_connections
+        num_default = num_intra = num_inter = 0
+        no_defaults = frozenset()
+        get_tree_idx = itemgetter(0)
+        for dst_key, sources in self.potential_sources_map.items():
+            defaults_here = default_src_by_dst.get(dst_key, no_defaults)
+            num_same_tree = list(map(get_tree_idx, sources)).count(dst_key[0])
+            num_default_here = sum(map(defaults_here.__contains__, sources))
+
+            num_inter += len(sources) - num_same_tree
+            num_default += num_default_here
+            num_intra += num_same_tree - num_default_here
+        return num_default, num_intra, num_inter
+
+    def _create_sharing_vars_for_node(self, m_dst, l_dst, k_dst, potential_sources):
+        # キーは供給元の座標タプル: Intra は (l_src, k_src)、Inter は (m_src, l_src, k_src)
+        # (文字列キーと違い、参照側で毎回フォーマット・解析する必要がない)
         intra_vars, inter_vars = {}, {}
+        # 変数名のうち供給先で決まる部分は、供給先ごとに一度だけフォーマットする
+        intra_prefix = f"w_intra_m{m_dst}_from_"
+        intra_suffix = f"_to_l{l_dst}k{k_dst}"
+        inter_suffix = f"_to_m{m_dst}l{l_dst}k{k_dst}"
         for m_src, l_src, k_src in potential_sources:
             if m_src == m_dst:
-                key = f"from_l{l_src}k{k_src}"
-                name = f"w_intra_m{m_dst}_from_l{l_src}k{k_src}_to_l{l_dst}k{k_dst}"
-                intra_vars[key] = name
+                intra_vars[(l_src, k_src)] = f"{intra_prefix}l{l_src}k{k_src}{intra_suffix}"
             else:
-                key = f"from_m{m_src}_l{l_src}k{k_src}"
-                name = f"w_inter_from_m{m_src}l{l_src}k{k_src}_to_m{m_dst}l{l_dst}k{k_dst}"
-                inter_vars[key] = name
-        return intra_vars, inter_vars
+                inter_vars[(m_src, l_src, k_src)] = f"w_inter_from_m{m_src}l{l_src}k{k_src}{inter_suffix}"
+        return intra_vars or EMPTY_SHARING_VARS, inter_vars or EMPTY_SHARING_VARS
 
     def _define_sharing_variables(self):
-        for m_dst, tree_dst in enumerate(self.forest):
-            for l_dst, nodes_dst in tree_dst.items():
-                for k_dst, node in enumerate(nodes_dst):
-                    intra, inter = self._create_sharing_vars_for_node(m_dst, l_dst, k_dst)
-                    node['intra_sharing_vars'] = intra
-                    node['inter_sharing_vars'] = inter
+        # 全ノードを三重ループで走査せず、候補エッジを持つ供給先だけを直接たどる
+        forest = self.forest
+        for (m_dst, l_dst, k_dst), sources in self.potential_sources_map.items():
+            node = forest[m_dst][l_dst][k_dst]
+            node.intra_sharing_vars, node.inter_sharing_vars = (
+                self._create_sharing_vars_for_node(m_dst, l_dst, k_dst, sources)
+            )
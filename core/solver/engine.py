@@ -1,20 +1,35 @@
 import time
-import sys
+import threading
 from ortools.sat.python import cp_model
 from utils.config_loader import Config
-from utils import parse_sharing_key
 from .solution import OrToolsSolutionModel
 import math
-from functools import reduce
+from functools import lru_cache
+from collections import defaultdict, namedtuple
 
-sys.setrecursionlimit(2000)
+# 共有入力 1 本分の情報。変数定義後に一度だけ構築し、制約生成やレポートで使い回す。
+# src: 供給元ノード (m, l, k), p_src: 供給元のP値, ratio_vars: 供給元の比率変数,
+# w_var: 共有量変数, w_max: w_var の上限, prod_max: w_var * ratio の上限
+SrcInfo = namedtuple("SrcInfo", ["src", "p_src", "ratio_vars", "w_var", "w_max", "prod_max"])
+
+@lru_cache(maxsize=None)
+def _lcm_of(values):
+    """整数のソート済みタプルの最小公倍数 (多くのノードが同じP値の組を持つためキャッシュする)"""
+    return math.lcm(*values)
 
 class SolutionPrinter(cp_model.CpSolverSolutionCallback):
-    """解が見つかるたびに進捗を表示するコールバッククラス"""
-    def __init__(self):
+    """
+    解が見つかるたびに進捗を表示するコールバッククラス。
+    plateau_seconds が指定された場合、最後に目的値が改善してから
+    その秒数だけ改善がなければ探索を打ち切る (anytime 的な早期終了)。
+    """
+    def __init__(self, plateau_seconds=None):
         cp_model.CpSolverSolutionCallback.__init__(self)
         self.__solution_count = 0
         self.__start_time = time.time()
+        self.__plateau_seconds = plateau_seconds
+        self.__timer = None
+        self.stopped_by_plateau = False
 
     def on_solution_callback(self):
         self.__solution_count += 1
@@ -22,6 +37,27 @@ class SolutionPrinter(cp_model.CpSolverSolutionCallback):
         obj = self.ObjectiveValue()
         print(f"Solution #{self.__solution_count}: Objective = {obj}, Time = {current_time - self.__start_time:.2f}s")
 
+        # CP-SAT は改善解のみをコールバックするため、解の報告 = 改善とみなせる
+        if self.__plateau_seconds:
+            self._restart_timer()
+
+    def _restart_timer(self):
+        """改善があるたびに打ち切りタイマーを張り直す"""
+        self.cancel_timer()
+        self.__timer = threading.Timer(self.__plateau_seconds, self._on_plateau)
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    def _on_plateau(self):
+        print(f"No improvement for {self.__plateau_seconds}s. Stopping search.")
+        self.stopped_by_plateau = True
+        self.StopSearch()
+
+    def cancel_timer(self):
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
     @property
     def solution_count(self):
         return self.__solution_count
@@ -42,15 +78,17 @@ class OrToolsSolver:
         self.variable_map = {} 
         self.objective_variable = None
 
-        self._configure_solver()
         self._set_variables_and_constraints()
+        self._install_objective(objective_mode)
 
     def _configure_solver(self):
         """ソルバーのパラメータ設定"""
-        if Config.MAX_CPU_WORKERS and Config.MAX_CPU_WORKERS > 0:
-            self.solver.parameters.num_workers = Config.MAX_CPU_WORKERS
-        else:
-            self.solver.parameters.num_workers = 0 
+        # 目的関数を差し替えるたびに新しい CpSolver を作り、全モード共通のパラメータを設定し直す
+        self.solver = cp_model.CpSolver()
+        # CP-SAT のポートフォリオは数個の汎用ワーカーと残りの LNS ワーカーで構成され、
+        # 16 を超えるとほぼ伸びず、かえって遅くなることもあるため 1..16 に丸める。
+        # 未設定 (None / 0) の場合は 8 ワーカーを使う。
+        self.solver.parameters.num_workers = max(1, min(Config.MAX_CPU_WORKERS or 8, 16))
         
         if Config.MAX_TIME_PER_RUN_SECONDS and Config.MAX_TIME_PER_RUN_SECONDS > 0:
             self.solver.parameters.max_time_in_seconds = float(Config.MAX_TIME_PER_RUN_SECONDS)
@@ -59,9 +97,9 @@ class OrToolsSolver:
             self.solver.parameters.absolute_gap_limit = float(Config.ABSOLUTE_GAP_LIMIT)
         
         self.solver.parameters.linearization_level = 0
-        self.solver.parameters.optimize_with_core = False 
+        self.solver.parameters.optimize_with_core = False
         self.solver.parameters.boolean_encoding_level = 1
-        self.solver.parameters.max_num_cuts = 2000 
+        self.solver.parameters.max_num_cuts = 2000
         self.solver.parameters.cut_level = 2
         self.solver.parameters.log_search_progress = True
         
@@ -73,12 +111,23 @@ class OrToolsSolver:
         # self.solver.parameters.symmetry_level = 2 
         # self.solver.parameters.log_search_progress = True
 
-    def solve(self):
+    def solve(self, objective_mode=None):
+        """
+        最適化を実行する。
+        objective_mode を指定した場合は、構築済みの基本モデル (変数・制約) を
+        そのまま使い回し、目的関数だけを差し替えてから解く。
+        """
+        if objective_mode is not None and objective_mode != self.objective_mode:
+            self._install_objective(objective_mode)
+
         start_time = time.time()
         print(f"\n--- Solving (mode: {self.objective_mode.upper()}) with Or-Tools CP-SAT ---")
         
-        solution_printer = SolutionPrinter()
-        status = self.solver.Solve(self.model, solution_printer)
+        solution_printer = SolutionPrinter(Config.PLATEAU_TIMEOUT_SECONDS)
+        try:
+            status = self.solver.Solve(self.model, solution_printer)
+        finally:
+            solution_printer.cancel_timer()
         
         elapsed_time = time.time() - start_time
         best_model = None
@@ -111,9 +160,33 @@ class OrToolsSolver:
         self.variable_map[name] = var
         return var
 
+    def _precompute_node_tables(self):
+        """
+        p_values と factors をリストに展開しておく。
+        ホットループ内でのタプルキーによる辞書参照を避けるため、
+        self._p[m][l][k] (P値) と self._f[m][l] (因数) で引けるようにする。
+        """
+        self._p = []
+        for m, p_tree in enumerate(self.problem.p_values):
+            levels = [[] for _ in self.problem.targets_config[m]['factors']]
+            for (l, k) in sorted(p_tree):
+                levels[l].append(p_tree[(l, k)])
+            self._p.append(levels)
+        self._f = [target['factors'] for target in self.problem.targets_config]
+
     def _define_or_tools_variables(self):
         """変数定義：DFMMノードの変数を初期化"""
         self.forest_vars = []
+        # 供給元ノード (m, l, k) -> そのノードから出ていく共有変数のリスト
+        self._outgoing_index = defaultdict(list)
+        self._precompute_node_tables()
+        p, f = self._p, self._f
+        # ホットループ内の属性参照を減らすため、頻出メソッドをローカルに束縛する
+        new_int_var = self.model.NewIntVar
+        new_bool_var = self.model.NewBoolVar
+        add_var = self._add_var
+        outgoing_index = self._outgoing_index
+        max_sharing_volume = Config.MAX_SHARING_VOLUME
 
         for target_idx, tree in enumerate(self.problem.forest):
             tree_data = {}
@@ -121,60 +194,64 @@ class OrToolsSolver:
             for level, nodes in tree.items():
                 level_nodes = []
                 for k, node_def in enumerate(nodes):
-                    # p_values を使用
-                    p_node = self.problem.p_values[target_idx][(level, k)]
-                    f_value = self.problem.targets_config[target_idx]['factors'][level]
+                    p_node = p[target_idx][level][k]
+                    f_value = f[target_idx][level]
                     
                     reagent_max = max(0, f_value - 1)
                     
                     # 比率変数
                     ratio_vars = [
-                        self._add_var(self.model.NewIntVar(0, p_node, name), name)
-                        for name in node_def['ratio_vars']
+                        add_var(new_int_var(0, p_node, name), name)
+                        for name in node_def.ratio_vars
                     ]
                     
                     # 試薬使用量変数
                     reagent_vars = [
-                        self._add_var(self.model.NewIntVar(0, reagent_max, name), name)
-                        for name in node_def['reagent_vars']
+                        add_var(new_int_var(0, reagent_max, name), name)
+                        for name in node_def.reagent_vars
                     ]
                     
                     max_sharing_vol = f_value
-                    if Config.MAX_SHARING_VOLUME is not None:
-                        max_sharing_vol = min(f_value, Config.MAX_SHARING_VOLUME)
+                    if max_sharing_volume is not None:
+                        max_sharing_vol = min(f_value, max_sharing_volume)
 
                     # 内部共有変数 (Intra)
+                    # キーは供給元の (l_src, k_src) で、(l_src, k_src, w_var, 上限) として保持する
+                    # 共有量の上限は min(f_dst, f_src, MAX_SHARING_VOLUME)
+                    # (供給元は自身の因子 f_src を超える量を生産できないため)
                     intra_sharing_vars = {}
-                    for key, name in node_def.get('intra_sharing_vars', {}).items():
-                        intra_sharing_vars[key] = self._add_var(
-                            self.model.NewIntVar(0, max_sharing_vol, name), name
-                        )
+                    intra_edges = []
+                    for key, name in node_def.intra_sharing_vars.items():
+                        l_src, k_src = key
+                        ub = min(max_sharing_vol, f[target_idx][l_src])
+                        w_var = add_var(new_int_var(0, ub, name), name)
+                        intra_sharing_vars[key] = w_var
+                        outgoing_index[(target_idx, l_src, k_src)].append(w_var)
+                        intra_edges.append((l_src, k_src, w_var, ub))
                     
                     # 外部共有変数 (Inter)
+                    # キーは供給元の (m_src, l_src, k_src) で、(m_src, l_src, k_src, w_var, 上限) として保持する
                     inter_sharing_vars = {}
-                    for key, name in node_def.get('inter_sharing_vars', {}).items():
-                        inter_sharing_vars[key] = self._add_var(
-                            self.model.NewIntVar(0, max_sharing_vol, name), name
-                        )
+                    inter_edges = []
+                    for key, name in node_def.inter_sharing_vars.items():
+                        m_src, l_src, k_src = key
+                        ub = min(max_sharing_vol, f[m_src][l_src])
+                        w_var = add_var(new_int_var(0, ub, name), name)
+                        inter_sharing_vars[key] = w_var
+                        outgoing_index[key].append(w_var)
+                        inter_edges.append((m_src, l_src, k_src, w_var, ub))
 
                     # 基本状態変数
-                    total_input_var = self._add_var(
-                        self.model.NewIntVar(0, f_value, node_def['total_input_var_name']),
-                        node_def['total_input_var_name']
+                    total_input_var = add_var(
+                        new_int_var(0, f_value, node_def.total_input_var_name),
+                        node_def.total_input_var_name
                     )
                     
-                    # IsActive変数の名前は固定パターンで生成
-                    is_active_name = f"IsActive_m{target_idx}_l{level}_k{k}"
-                    is_active_var = self._add_var(
-                        self.model.NewBoolVar(is_active_name), is_active_name
-                    )
+                    # IsActive変数は node_vars 経由でのみ参照されるため、無名で作成し
+                    # variable_map にも登録しない (プロトの名前テーブルを小さく保つ)
+                    # ルートノードは常にアクティブなので変数を作らない (None)
+                    is_active_var = new_bool_var("") if level > 0 else None
 
-                    waste_var = None
-                    if node_def['waste_var_name']:
-                        waste_var = self._add_var(
-                            self.model.NewIntVar(0, f_value, node_def['waste_var_name']),
-                            node_def['waste_var_name']
-                        )
 
                     # 構造化データとして保存
                     node_vars = {
@@ -182,27 +259,60 @@ class OrToolsSolver:
                         "reagent_vars": reagent_vars,
                         "intra_sharing_vars": intra_sharing_vars,
                         "inter_sharing_vars": inter_sharing_vars,
+                        "intra_edges": intra_edges,
+                        "inter_edges": inter_edges,
                         "total_input_var": total_input_var,
-                        "is_active_var": is_active_var,
-                        "waste_var": waste_var
+                        "is_active_var": is_active_var
                     }
                     level_nodes.append(node_vars)
                 
                 tree_data[level] = level_nodes
             self.forest_vars.append(tree_data)
 
+        # 各制約メソッドが全ノードを走査するため、走査結果を一度だけ平坦化しておく
+        self._all_nodes = [
+            (target_idx, level, node_idx, node_vars)
+            for target_idx, tree in enumerate(self.forest_vars)
+            for level, nodes in tree.items()
+            for node_idx, node_vars in enumerate(nodes)
+        ]
+
+        self._build_input_sources()
+
+    def _build_input_sources(self):
+        """
+        各ノードの共有入力を SrcInfo のリストとして node_vars['input_sources'] に格納する。
+        Inter 共有の供給元は後続ターゲットにある場合もあるため、全ノードの変数定義後に行う。
+        並びは Intra -> Inter の順。
+        """
+        p = self._p
+        forest_vars = self.forest_vars
+        for m, _, _, node_vars in self._all_nodes:
+            input_sources = []
+            # (A) Intra Sharing
+            for src_l, src_k, w_var, w_max in node_vars['intra_edges']:
+                p_src = p[m][src_l][src_k]
+                input_sources.append(SrcInfo(
+                    (m, src_l, src_k), p_src,
+                    forest_vars[m][src_l][src_k]['ratio_vars'], w_var, w_max, w_max * p_src
+                ))
+            # (B) Inter Sharing
+            for src_m, src_l, src_k, w_var, w_max in node_vars['inter_edges']:
+                p_src = p[src_m][src_l][src_k]
+                input_sources.append(SrcInfo(
+                    (src_m, src_l, src_k), p_src,
+                    forest_vars[src_m][src_l][src_k]['ratio_vars'], w_var, w_max, w_max * p_src
+                ))
+            node_vars['input_sources'] = input_sources
+
     def _set_variables_and_constraints(self):
         """制約設定のメインフロー"""
         self._define_or_tools_variables()
         self._set_initial_constraints()
-        self._set_conservation_constraints()
         self._set_concentration_constraints()
-        self._set_ratio_sum_constraints()
-        self._set_leaf_node_constraints()
-        self._set_mixer_capacity_constraints()
-        self._set_activity_constraints()
-        
-        self.objective_variable = self._set_objective_function()
+        self._set_per_node_constraints()
+        if Config.ENABLE_SYMMETRY_BREAKING:
+            self._set_symmetry_breaking_constraints()
 
     # --- ヘルパーメソッド ---
 
@@ -215,28 +325,12 @@ class OrToolsSolver:
         )
 
     def _get_outgoing_vars(self, src_target_idx, src_level, src_node_idx):
-        """あるノードから出ていく全共有変数を取得"""
-        outgoing = []
-        key_intra = f"from_l{src_level}k{src_node_idx}"
-        key_inter = f"from_m{src_target_idx}_l{src_level}k{src_node_idx}"
-        
-        for dst_target_idx, tree_dst in enumerate(self.forest_vars):
-            for dst_level, level_dst in tree_dst.items():
-                for node_dst in level_dst:
-                    # Intra-sharing
-                    if src_target_idx == dst_target_idx and key_intra in node_dst.get("intra_sharing_vars", {}):
-                        outgoing.append(node_dst["intra_sharing_vars"][key_intra])
-                    # Inter-sharing
-                    elif src_target_idx != dst_target_idx and key_inter in node_dst.get("inter_sharing_vars", {}):
-                        outgoing.append(node_dst["inter_sharing_vars"][key_inter])
-        return outgoing
+        """あるノードから出ていく全共有変数を取得 (変数定義時に構築した索引を引く)"""
+        return self._outgoing_index.get((src_target_idx, src_level, src_node_idx), [])
 
     def _iterate_all_nodes(self):
-        """全DFMMノードをイテレートするジェネレータ"""
-        for target_idx, tree in enumerate(self.forest_vars):
-            for level, nodes in tree.items():
-                for node_idx, node_vars in enumerate(nodes):
-                    yield target_idx, level, node_idx, node_vars
+        """全DFMMノードの (target_idx, level, node_idx, node_vars) リストを返す"""
+        return self._all_nodes
 
     # --- 制約メソッド ---
 
@@ -248,183 +342,225 @@ class OrToolsSolver:
                 for t in range(self.problem.num_reagents):
                     self.model.Add(root_vars['ratio_vars'][t] == target['ratios'][t])
 
-    def _set_conservation_constraints(self):
-        """質量保存則: 生産量 == 全入力の和"""
-        for _, _, _, node_vars in self._iterate_all_nodes():
-            total_produced = node_vars["total_input_var"]
-            self.model.Add(total_produced == sum(self._get_input_vars(node_vars)))
-
     def _lcm(self, numbers):
-        """整数のリストの最小公倍数を計算するヘルパー"""
-        if not numbers:
-            return 1
-        return reduce(lambda x, y: (x * y) // math.gcd(x, y), numbers)
+        """整数のリストの最小公倍数を計算するヘルパー (同じP値の組み合わせは再計算しない)"""
+        return _lcm_of(tuple(sorted(set(numbers))))
 
     def _set_concentration_constraints(self):
         """濃度保存則: LCMを用いて整数演算のみで厳密に計算する"""
         
-        for dst_target_idx, dst_level, dst_node_idx, node_vars in self._iterate_all_nodes():
-            p_dst = self.problem.p_values[dst_target_idx][(dst_level, dst_node_idx)]
-            f_dst = self.problem.targets_config[dst_target_idx]['factors'][dst_level]
-            node_name_prefix = f"m{dst_target_idx}l{dst_level}k{dst_node_idx}"
+        p, f = self._p, self._f
+        # ホットループ内の属性参照を減らすため、頻出メソッドをローカルに束縛する
+        add = self.model.Add
+        new_int_var = self.model.NewIntVar
+        add_mul = self.model.AddMultiplicationEquality
+        num_reagents = self.problem.num_reagents
+        use_channeling = Config.ENABLE_PRODUCT_CHANNELING
+        weighted_sum = cp_model.LinearExpr.WeightedSum
 
-            # 1. 入力元の情報を収集 (P値と変数を取得)
-            # 形式: (p_src, ratio_var, volume_var, key_name, scaling_limit)
-            input_sources = []
-
-            # (A) Intra Sharing
-            for key, w_var in node_vars.get('intra_sharing_vars', {}).items():
-                key_no_prefix = key.replace("from_", "")
-                parsed = parse_sharing_key(key_no_prefix)
-                src_l, src_k = parsed["level"], parsed["node_idx"]
-                
-                p_src = self.problem.p_values[dst_target_idx][(src_l, src_k)]
-                r_src_vars = self.forest_vars[dst_target_idx][src_l][src_k]['ratio_vars']
-                f_src = self.problem.targets_config[dst_target_idx]['factors'][src_l]
-                
-                input_sources.append({
-                    "p_src": p_src, "ratio_vars": r_src_vars, "w_var": w_var,
-                    "key": key, "limit_vol": f_src
-                })
-
-            # (B) Inter Sharing
-            for key, w_var in node_vars.get('inter_sharing_vars', {}).items():
-                key_no_prefix = key.replace("from_", "")
-                parsed = parse_sharing_key(key_no_prefix)
-                src_m, src_l, src_k = parsed["target_idx"], parsed["level"], parsed["node_idx"]
-                
-                p_src = self.problem.p_values[src_m][(src_l, src_k)]
-                r_src_vars = self.forest_vars[src_m][src_l][src_k]['ratio_vars']
-                f_src = self.problem.targets_config[src_m]['factors'][src_l]
+        for dst_target_idx, dst_level, dst_node_idx, node_vars in self._iterate_all_nodes():
+            p_dst = p[dst_target_idx][dst_level][dst_node_idx]
+            f_dst = f[dst_target_idx][dst_level]
 
-                input_sources.append({
-                    "p_src": p_src, "ratio_vars": r_src_vars, "w_var": w_var,
-                    "key": key, "limit_vol": f_src
-                })
+            # 1. 入力元の情報 (変数定義時に SrcInfo として構築済み)
+            input_sources = node_vars['input_sources']
 
             # 2. LCM (最小公倍数) の計算
             # ターゲットのp_dst と すべてのソースの p_src のLCMをとる
-            all_p_values = [src["p_src"] for src in input_sources] + [p_dst]
+            all_p_values = [src.p_src for src in input_sources] + [p_dst]
             common_multiple = self._lcm(all_p_values)
 
+            # スケール係数は試薬に依存しないため、ノードごとに一度だけ計算する
+            # LHS: LCM / p_dst, 供給元: LCM / p_src, 純粋試薬: LCM / 1
+            lhs_coeff = f_dst * (common_multiple // p_dst)
+            src_scales = [common_multiple // src.p_src for src in input_sources]
+            dst_ratio_vars = node_vars['ratio_vars']
+            dst_reagent_vars = node_vars['reagent_vars']
+
+            # 共有量の値リテラル (供給元ごとに一度だけ作り、全試薬で共有する)
+            value_lits = {}
+
             # 3. 試薬ごとの保存則制約を作成
             # 基本式: Vol * Ratio * (LCM / P) の総和が等しい
             
-            for t in range(self.problem.num_reagents):
+            for t in range(num_reagents):
                 # --- 左辺 (Output) ---
                 # LHS = f_dst * ratio_dst * (LCM / p_dst)
-                lhs_scale = common_multiple // p_dst
-                # 大きくなりすぎないよう、計算途中用の変数を定義するか、直接式を書く
-                # ここではスッキリさせるため直接記述
-                lhs_term = f_dst * node_vars['ratio_vars'][t] * lhs_scale
+                lhs_term = dst_ratio_vars[t] * lhs_coeff
 
                 # --- 右辺 (Inputs) ---
-                rhs_terms = []
+                # 変数と係数を別々に集め、WeightedSum で一度に式を組み立てる
+                rhs_vars = []
+                rhs_coeffs = []
 
                 # (1) 直接投入試薬 (Pure Reagent)
                 # 純粋試薬は「濃度1 (100%)」とみなす => P=1 相当
                 # したがって、スケールは LCM / 1 = LCM
-                if t < len(node_vars['reagent_vars']):
-                    vol_var = node_vars['reagent_vars'][t]
-                    rhs_terms.append(vol_var * common_multiple)
+                if t < len(dst_reagent_vars):
+                    rhs_vars.append(dst_reagent_vars[t])
+                    rhs_coeffs.append(common_multiple)
 
                 # (2) 共有入力 (Intra + Inter)
-                for src in input_sources:
-                    scale = common_multiple // src["p_src"]
-                    r_src_var = src["ratio_vars"][t]
-                    w_var = src["w_var"]
+                for src_idx, src in enumerate(input_sources):
+                    scale = src_scales[src_idx]
+                    r_src_var = src.ratio_vars[t]
+                    w_var = src.w_var
                     
                     # 積: prod = w_var * r_src_var
-                    # 変数の上限を見積もる (Volume_Max * P_Max)
-                    prod_max = src["limit_vol"] * src["p_src"]
-                    
-                    prod = self.model.NewIntVar(0, prod_max, f"Prod_{node_name_prefix}_{src['key']}_r{t}")
-                    self.model.AddMultiplicationEquality(prod, [w_var, r_src_var])
+                    # 積変数はこの制約以外から参照されないため無名にする
+                    prod = new_int_var(0, src.prod_max, "")
+                    if use_channeling:
+                        if src_idx not in value_lits:
+                            value_lits[src_idx] = self._channel_sharing_value(src)
+                        # w_var == v のとき prod == v * r_src_var (線形) を強制する
+                        for v, lit in enumerate(value_lits[src_idx]):
+                            add(prod == v * r_src_var).OnlyEnforceIf(lit)
+                    else:
+                        add_mul(prod, [w_var, r_src_var])
                     
                     # スケール倍して加算
-                    rhs_terms.append(prod * scale)
+                    rhs_vars.append(prod)
+                    rhs_coeffs.append(scale)
 
                 # 等式の登録
-                self.model.Add(lhs_term == sum(rhs_terms))
+                # 全係数の最大公約数で割り、係数をできるだけ小さくしてから登録する
+                g = math.gcd(lhs_coeff, *rhs_coeffs)
+                if g > 1:
+                    rhs_coeffs = [c // g for c in rhs_coeffs]
+                    lhs_term = dst_ratio_vars[t] * (lhs_coeff // g)
+                add(lhs_term == weighted_sum(rhs_vars, rhs_coeffs))
+
+    def _channel_sharing_value(self, src):
+        """
+        共有量 w_var の値 v (0..w_max) ごとにリテラル b_v を作り、
+        ExactlyOne(b_v) と b_v => (w_var == v) で w_var と結び付ける。
+        w_var のドメインは高々ミキサーサイズ程度と小さいため、乗算制約を
+        b_v で条件付けた線形制約に置き換えられる。
+        """
+        lits = [self.model.NewBoolVar("") for _ in range(src.w_max + 1)]
+        self.model.AddExactlyOne(lits)
+        for v, lit in enumerate(lits):
+            self.model.Add(src.w_var == v).OnlyEnforceIf(lit)
+        return lits
+
+    def _set_per_node_constraints(self):
+        """
+        ノード単位で完結する制約を、全ノードを一度だけ走査して登録する。
+          - 質量保存則: 生産量 == 全入力の和
+          - 比率変数の総和制約: sum(ratio) == p * IsActive
+          - 葉ノード制約: p == f のノードでは ratio == 試薬投入量
+          - ミキサー容量制約: ルートは生産量 == f (常にアクティブ)、他は生産量 == f * IsActive
+          - アクティビティ制約: アクティブ <=> 使用量 >= 1
+          - 廃棄量: 生産量 - 使用量 (目的関数の候補となる線形式も同時に集計する)
+        目的関数そのものは _install_objective で設定するため、
+        モードを切り替えてもここで作った制約はそのまま再利用される。
+        """
+        add = self.model.Add
+        linear_sum = cp_model.LinearExpr.Sum
+        p, f = self._p, self._f
+        num_reagents = self.problem.num_reagents
+
+        produced_vars = []
+        all_used_vars = []
+        all_activity_vars = []
+        all_reagent_vars = []
+        num_roots = 0
 
-    def _set_ratio_sum_constraints(self):
-        """比率変数の総和制約"""
         for m, l, k, node_vars in self._iterate_all_nodes():
-            p_node = self.problem.p_values[m][(l, k)]
+            p_node = p[m][l][k]
+            f_node = f[m][l]
+            ratio_vars = node_vars['ratio_vars']
+            reagent_vars = node_vars['reagent_vars']
+            total_prod = node_vars["total_input_var"]
             is_active = node_vars["is_active_var"]
-            self.model.Add(sum(node_vars['ratio_vars']) == p_node * is_active)
 
-    def _set_leaf_node_constraints(self):
-        """葉ノード制約"""
-        for m, l, k, node_vars in self._iterate_all_nodes():
-            p_node = self.problem.p_values[m][(l, k)]
-            f_node = self.problem.targets_config[m]['factors'][l]
+            # 質量保存則
+            add(total_prod == linear_sum(self._get_input_vars(node_vars)))
+
+            # 葉ノード制約
             if p_node == f_node:
-                for t in range(self.problem.num_reagents):
-                    self.model.Add(node_vars['ratio_vars'][t] == node_vars['reagent_vars'][t])
+                for t in range(num_reagents):
+                    add(ratio_vars[t] == reagent_vars[t])
 
-    def _set_mixer_capacity_constraints(self):
-        """ミキサー容量制約"""
-        for m, l, k, node_vars in self._iterate_all_nodes():
-            f_value = self.problem.targets_config[m]['factors'][l]
-            total_sum = node_vars["total_input_var"]
-            is_active = node_vars["is_active_var"]
-            
+            # ルートノードは常にアクティブ (IsActive = 1 として定数畳み込み)
             if l == 0:
-                self.model.Add(total_sum == f_value)
-                self.model.Add(is_active == 1)
-            else:
-                self.model.Add(total_sum == f_value * is_active)
+                add(linear_sum(ratio_vars) == p_node)
+                add(total_prod == f_node)
+                num_roots += 1
+                continue
 
-    def _set_activity_constraints(self):
-        """アクティビティ制約"""
+            # 比率変数の総和制約
+            add(linear_sum(ratio_vars) == p_node * is_active)
+
+            # ミキサー容量制約
+            add(total_prod == f_node * is_active)
+            all_activity_vars.append(is_active)
+
+            # アクティビティ制約
+            total_used = linear_sum(self._get_outgoing_vars(m, l, k))
+            add(total_used >= 1).OnlyEnforceIf(is_active)
+            add(total_used == 0).OnlyEnforceIf(is_active.Not())
+
+            # 廃棄量 = 生産量 - 使用量 は非負 (使用量 <= 生産量)
+            add(total_used <= total_prod)
+            produced_vars.append(total_prod)
+            all_used_vars.extend(self._get_outgoing_vars(m, l, k))
+            all_reagent_vars.extend(reagent_vars)
+
+        self._objective_terms = {
+            # 総廃棄量 = (非ルートノードの総生産量) - (非ルートノードからの総使用量)
+            # ノードごとの廃棄量は解析時に Python 側で計算する
+            "waste": linear_sum(produced_vars) - linear_sum(all_used_vars),
+            # ルートノードの操作回数は定数オフセットとして加える
+            "operations": linear_sum(all_activity_vars) + num_roots,
+            "reagents": linear_sum(all_reagent_vars),
+        }
+
+    def _set_symmetry_breaking_constraints(self):
+        """
+        対称性除去制約。
+        同じターゲット・レベルの兄弟ノードのうち、P値・供給元の集合・供給先の集合が
+        すべて一致するものは、変数の割り当てを入れ替えても解として等価になる。
+        そのようなノード群では生産量が k の昇順に非増加となるよう順序付ける。
+        """
+        add = self.model.Add
+        p = self._p
+
+        # 供給元 (m, l, k) -> 供給先ノードの集合
+        destinations = defaultdict(set)
         for m, l, k, node_vars in self._iterate_all_nodes():
-            if l == 0: continue 
-            total_used_vars = self._get_outgoing_vars(m, l, k)
-            is_active = node_vars["is_active_var"]
-            total_used = sum(total_used_vars)
-            self.model.Add(total_used >= 1).OnlyEnforceIf(is_active)
-            self.model.Add(total_used == 0).OnlyEnforceIf(is_active.Not())
+            for src in node_vars['input_sources']:
+                destinations[src.src].add((m, l, k))
 
-    def _set_objective_function(self):
-        """目的関数の設定"""
-        all_waste_vars = []
-        all_activity_vars = []
-        all_reagent_vars = []
-        
+        groups = defaultdict(list)
         for m, l, k, node_vars in self._iterate_all_nodes():
-            if l == 0:
-                all_activity_vars.append(node_vars["is_active_var"])
-                continue
-            
-            total_prod = node_vars["total_input_var"]
-            total_used = sum(self._get_outgoing_vars(m, l, k))
-            waste_var = node_vars["waste_var"]
-            
-            self.model.Add(waste_var == total_prod - total_used)
-            
-            all_waste_vars.append(waste_var)
-            all_activity_vars.append(node_vars["is_active_var"])
-            all_reagent_vars.extend(node_vars.get("reagent_vars", []))
-            
-        total_waste = sum(all_waste_vars)
-        total_operations = sum(all_activity_vars)
-        total_reagents = sum(all_reagent_vars)
-
-        if self.objective_mode == "waste":
-            self.model.Add(total_waste >= 0)
-            self.model.Minimize(total_waste)
-            self.variable_map["objective_variable"] = total_waste
-            return total_waste
-            
-        elif self.objective_mode == "operations":
-            self.model.Minimize(total_operations)
-            self.variable_map["objective_variable"] = total_operations
-            return total_operations
+            if l == 0: continue
+            signature = (
+                m, l, p[m][l][k],
+                frozenset(src.src for src in node_vars['input_sources']),
+                frozenset(destinations.get((m, l, k), ())),
+            )
+            groups[signature].append(node_vars["total_input_var"])
+
+        for total_inputs in groups.values():
+            for prev, nxt in zip(total_inputs, total_inputs[1:]):
+                add(prev >= nxt)
 
-        elif self.objective_mode == "reagents":
-            self.model.Minimize(total_reagents)
-            return total_reagents
+    def _install_objective(self, objective_mode):
+        """目的関数を (再) 設定し、共通パラメータでソルバーを作り直す"""
+        if objective_mode not in self._objective_terms:
+            raise ValueError(f"Unknown optimization mode: '{objective_mode}'")
+
+        self.objective_mode = objective_mode
+        objective = self._objective_terms[objective_mode]
 
+        self.model.ClearObjective()
+        self.model.Minimize(objective)
+        self.objective_variable = objective
+
+        if objective_mode in ("waste", "operations"):
+            self.variable_map["objective_variable"] = objective
         else:
-            raise ValueError(f"Unknown optimization mode: '{self.objective_mode}'")
+            self.variable_map.pop("objective_variable", None)
+
+        self._configure_solver()
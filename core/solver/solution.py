@@ -1,6 +1,6 @@
 # core/solver/solution.py
 from ortools.sat.python import cp_model
-from utils import create_dfmm_node_name, parse_sharing_key
+from utils import create_dfmm_node_name
 
 class OrToolsSolutionModel:
     """
@@ -14,28 +14,61 @@ class OrToolsSolutionModel:
         self.forest_vars = forest_vars
         self.peer_vars = peer_vars
         self.objective_value = objective_value
+        self._node_wastes = None
+        # 解の値ベクトルを一度だけ取り出しておき、変数インデックスで引く
+        # (変数ごとに solver.Value を呼ぶと Python <-> C++ の往復が発生するため)
+        self._values = list(solver.ResponseProto().solution)
 
     def eval(self, target):
-        """変数オブジェクトまたは変数名から値を取得する"""
-        # 文字列の場合のチェックを先に行う
+        """変数オブジェクト・線形式・リテラル、または変数名から値を取得する (solver.Value と同じ値を返す)"""
         if isinstance(target, str):
-            if target == "objective_variable": 
-                return self.objective_value
-            if target in self.variable_map:
-                var = self.variable_map[target]
-                return self.solver.Value(var)
-            return 0 
-
-        # 変数オブジェクトの場合
-        try:
-            return self.solver.Value(target)
-        except:
+            return self._v_name(target)
+        if target is None:
             return 0
+        # IntVar は解ベクトルから引き、線形式や Not() リテラルはソルバーで評価する
+        if isinstance(target, cp_model.IntVar):
+            return self._v_var(target)
+        return self.solver.Value(target)
 
     def _v(self, target):
         """evalのエイリアス (整数値を返す)"""
         return int(self.eval(target))
 
+    def _v_var(self, var):
+        """IntVar の値を解ベクトルから返す。型判定や例外処理を挟まない高速版"""
+        return self._values[var.Index()]
+
+    def _v_name(self, name):
+        """変数名から値を取得する ("objective_variable" は目的関数値)"""
+        if name == "objective_variable":
+            return self.objective_value
+        return self.eval(self.variable_map.get(name))
+
+    def get_node_wastes(self):
+        """
+        非ルートノードごとの廃棄量 {(m, l, k): 生産量 - 使用量} を返す。
+        廃棄量はモデル上の変数を持たないため、共有入力の値から Python 側で集計する。
+        """
+        if self._node_wastes is None:
+            value = self._v_var
+            used = {}
+            for tree_vars in self.forest_vars:
+                for node_vars_list in tree_vars.values():
+                    for node_vars in node_vars_list:
+                        for src in node_vars.get('input_sources', []):
+                            used[src.src] = used.get(src.src, 0) + value(src.w_var)
+
+            self._node_wastes = {}
+            for target_idx, tree_vars in enumerate(self.forest_vars):
+                for level, node_vars_list in tree_vars.items():
+                    if level == 0: continue
+                    for node_idx, node_vars in enumerate(node_vars_list):
+                        node_id = (target_idx, level, node_idx)
+                        self._node_wastes[node_id] = (
+                            value(node_vars['total_input_var']) - used.get(node_id, 0)
+                        )
+        return self._node_wastes
+
     def analyze(self):
         """
         解を分析し、レポート用の辞書を返します。
@@ -48,27 +81,34 @@ class OrToolsSolutionModel:
             "nodes_details": [],
         }
 
+        node_wastes = self.get_node_wastes()
+        value = self._v_var
+
         # forest_vars (構造化データ) を使用して反復
         for target_idx, tree_vars in enumerate(self.forest_vars):
             for level, node_vars_list in tree_vars.items():
                 for node_idx, node_vars in enumerate(node_vars_list):
                     
-                    total_input = self._v(node_vars['total_input_var'])
+                    total_input = value(node_vars['total_input_var'])
                     
                     if total_input == 0: continue
 
                     results["total_operations"] += 1
                     
-                    # 試薬使用量
-                    reagent_vals = [self._v(var) for var in node_vars['reagent_vars']]
-                    for r_idx, val in enumerate(reagent_vals):
-                        if val > 0:
+                    # 試薬使用量 (同じ走査で混合内容の説明も組み立てる)
+                    mixing_desc = []
+                    for r_idx, var in enumerate(node_vars['reagent_vars']):
+                        if (val := value(var)) > 0:
                             results["total_reagent_units"] += val
                             results["reagent_usage"][r_idx] = results["reagent_usage"].get(r_idx, 0) + val
+                            mixing_desc.append(f"{val} x Reagent{r_idx+1}")
+                    # 共有入力 (Intra -> Inter の順。供給元座標は SrcInfo に解析済み)
+                    for src in node_vars.get('input_sources', []):
+                        if (val := value(src.w_var)) > 0:
+                            mixing_desc.append(f"{val} x {create_dfmm_node_name(*src.src)}")
                             
-                    # 廃棄物量 [MODIFIED] 明示的に is not None でチェックする
-                    if node_vars['waste_var'] is not None:
-                         results["total_waste"] += self._v(node_vars['waste_var'])
+                    # 廃棄物量 (ルートノードは廃棄を持たない)
+                    results["total_waste"] += node_wastes.get((target_idx, level, node_idx), 0)
                          
                     # ノード詳細
                     node_name = create_dfmm_node_name(target_idx, level, node_idx)
@@ -77,32 +117,9 @@ class OrToolsSolutionModel:
                         "level": level,
                         "name": node_name,
                         "total_input": total_input,
-                        "ratio_composition": [self._v(var) for var in node_vars['ratio_vars']],
-                        "mixing_str": self._generate_mixing_description(node_vars, target_idx)
+                        "ratio_composition": [value(var) for var in node_vars['ratio_vars']],
+                        "mixing_str": ' + '.join(mixing_desc)
                     })
                     
         results["nodes_details"].sort(key=lambda x: (x["target_id"], x["level"]))
         return results
-
-    def _generate_mixing_description(self, node_vars, tree_idx):
-        """ノードの混合内容を説明する文字列を生成"""
-        desc = []
-        # 試薬
-        for r_idx, var in enumerate(node_vars.get('reagent_vars', [])):
-            if (val := self._v(var)) > 0:
-                desc.append(f"{val} x Reagent{r_idx+1}")
-        # 内部共有
-        for key, var in node_vars.get('intra_sharing_vars', {}).items():
-            if (val := self._v(var)) > 0:
-                # key="from_l{l}k{k}" -> v_m{tree}_l{l}_k{k}
-                parsed = parse_sharing_key(key.replace("from_", ""))
-                src_name = create_dfmm_node_name(tree_idx, parsed["level"], parsed["node_idx"])
-                desc.append(f"{val} x {src_name}")
-        # 外部共有
-        for key, var in node_vars.get('inter_sharing_vars', {}).items():
-            if (val := self._v(var)) > 0:
-                # key="from_m{m}_l{l}k{k}" -> v_m{m}_l{l}_k{k}
-                parsed = parse_sharing_key(key.replace("from_", ""))
-                src_name = create_dfmm_node_name(parsed["target_idx"], parsed["level"], parsed["node_idx"])
-                desc.append(f"{val} x {src_name}")
-        return ' + '.join(desc)
\ No newline at end of file
@@ -1,8 +1,10 @@
 import os
 import sys
+from xml.sax.saxutils import escape
 import networkx as nx
 import matplotlib.pyplot as plt
 import matplotlib.lines as mlines
+from matplotlib.collections import LineCollection
 
 # --- パス解決 ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -14,7 +16,7 @@ if root_dir not in sys.path:
 # 既存モジュールのインポート
 from utils.config_loader import Config
 from utils import create_dfmm_node_name
-from core.algorithm.dfmm import build_dfmm_forest, calculate_p_values_from_structure, apply_auto_factors
+from core.algorithm.dfmm import build_dfmm_structures, apply_auto_factors
 from core.model.problem import MTWMProblem
 from scenarios import TARGETS_FOR_MANUAL_MODE, TARGETS_FOR_AUTO_MODE
 
@@ -38,6 +40,15 @@ class StructureVisualizer:
         "x_gap": 6.0, "y_gap": 5.0, "tree_gap": 10.0, 
     }
 
+    # PNG出力解像度 (診断用の図なので 100dpi で十分。tight_layout 済みのため bbox の再計測は行わない)
+    PNG_DPI = 100
+
+    # エッジ数がこれを超える場合は matplotlib を使わず SVG を直接書き出す
+    SVG_EDGE_THRESHOLD = 1000
+    # SVG出力時の座標スケール (レイアウト座標 1 あたりのピクセル数) と線種
+    SVG_SCALE = 20.0
+    SVG_DASHARRAY = {"solid": None, "dashed": "6,4", "dotted": "2,3"}
+
     def __init__(self, problem, tree_structures):
         self.problem = problem
         self.tree_structures = tree_structures
@@ -50,43 +61,32 @@ class StructureVisualizer:
         G = nx.DiGraph()
         
         # 1. 必須接続(Default Connections)の特定
-        default_connections = set()
-        for m, tree in enumerate(self.tree_structures):
-            for (p_lvl, p_idx), data in tree.items():
-                for (c_lvl, c_idx) in data['children']:
-                    dst = (m, p_lvl, p_idx)
-                    src = (m, c_lvl, c_idx)
-                    default_connections.add((dst, src))
+        default_src_by_dst = self.problem.default_connections
+        no_defaults = frozenset()
 
         # 2. ノードの追加 (DFMM Nodes)
-        for m, tree in enumerate(self.problem.forest):
-            for level, nodes in tree.items():
-                for k, _ in enumerate(nodes):
-                    node_name = create_dfmm_node_name(m, level, k)
-                    p_val = self.problem.p_values[m].get((level, k), "?")
-                    
-                    label = f"T{m+1}\n(P={p_val})"
-                    if level == 0:
-                        label = f"Target {m+1}\n(Root)"
-                        
-                    G.add_node(node_name, label=label, level=level, target=m, type="mix")
-                    
-                    # 試薬ノードとエッジの追加 (Reagent Edges)
-                    num_reagents = self.problem.num_reagents
-                    for r_idx in range(num_reagents):
-                        r_name = f"R_dummy_{node_name}_{r_idx}"
-                        G.add_node(r_name, label=f"R{r_idx+1}", level=level+0.8, target=m, type="reagent")
-                        G.add_edge(r_name, node_name, type="reagent")
+        # ノードID順 (ターゲット -> レベル -> ノード番号) に走査し、P値はIDで配列から引く
+        p_by_id = self.problem.p_by_id
+        for node_id, (m, level, k) in enumerate(self.problem.id_to_key):
+            node_name = create_dfmm_node_name(m, level, k)
+            
+            label = f"T{m+1}\n(P={p_by_id[node_id]})"
+            if level == 0:
+                label = f"Target {m+1}\n(Root)"
+                
+            G.add_node(node_name, label=label, level=level, target=m, type="mix")
+            # 試薬ノード・試薬エッジは Graph に持たせず、描画時に親ノードの位置から配置する
 
         # 3. エッジの追加
         # potential_sources_map: (m, l, k) -> list of (m, l, k)
         for dst_key, sources in self.problem.potential_sources_map.items():
             dst_name = create_dfmm_node_name(*dst_key)
+            defaults_here = default_src_by_dst.get(dst_key, no_defaults)
             
             for src in sources:
                 # src is a tuple (m, l, k)
                 src_name = create_dfmm_node_name(*src)
-                is_default = (dst_key, src) in default_connections
+                is_default = src in defaults_here
                 
                 if is_default:
                     G.add_edge(src_name, dst_name, type="default")
@@ -95,51 +95,82 @@ class StructureVisualizer:
 
         return G
 
+    def count_edges(self, mode="full"):
+        """
+        generate_graph(mode) が作るグラフのエッジ数を、Graphを構築せずに数える
+        (試薬エッジ + 必須エッジ + [full の場合] 共有候補エッジ)
+        """
+        problem = self.problem
+        edge_count = len(problem.id_to_key) * problem.num_reagents
+
+        if mode == "full":
+            return edge_count + len(problem.edges_src)
+
+        num_default, _, _ = problem.count_edge_classes()
+        edge_count += num_default
+        return edge_count
+
     def draw_and_save(self, G, output_path, title):
-        pos = self._calculate_node_positions(G)
+        by_target_level, by_style = self._group_nodes(G)
+        pos = self._calculate_node_positions(G, by_target_level)
+        edgelists = self._group_edges(G, by_style["reagent_node"])
+
+        # 大規模グラフでは PNG のラスタライズが支配的になるため、SVG を直接出力する
+        if sum(map(len, edgelists.values())) > self.SVG_EDGE_THRESHOLD:
+            svg_path = os.path.splitext(output_path)[0] + ".svg"
+            self._draw_and_save_svg(G, pos, by_style, edgelists, svg_path, title)
+            return
         
         plt.figure(figsize=(20, 12))
         ax = plt.gca()
         
-        # ノード描画
-        for node_type in ["mix", "target_node", "reagent"]:
-            style_key = "mix_node"
-            if node_type == "reagent": style_key = "reagent_node"
-            
-            nodelist = [n for n, d in G.nodes(data=True) if d.get("type") == node_type]
+        # ノード描画 (ターゲット -> 中間混合 -> 試薬 の順)
+        for style_key in ["target_node", "mix_node", "reagent_node"]:
+            nodelist = by_style[style_key]
             if not nodelist: continue
-
-            if node_type == "mix":
-                target_nodes = [n for n in nodelist if G.nodes[n].get("level") == 0]
-                mix_nodes = [n for n in nodelist if G.nodes[n].get("level") != 0]
-                nx.draw_networkx_nodes(G, pos, nodelist=target_nodes, node_color=self.STYLE_CONFIG["target_node"]["color"], node_size=self.STYLE_CONFIG["target_node"]["size"], ax=ax, edgecolors="black")
-                nx.draw_networkx_nodes(G, pos, nodelist=mix_nodes, node_color=self.STYLE_CONFIG["mix_node"]["color"], node_size=self.STYLE_CONFIG["mix_node"]["size"], ax=ax, edgecolors="black")
-            else:
-                nx.draw_networkx_nodes(G, pos, nodelist=nodelist, node_color=self.STYLE_CONFIG[style_key]["color"], node_size=self.STYLE_CONFIG[style_key]["size"], ax=ax, edgecolors="black")
+            style = self.STYLE_CONFIG[style_key]
+            nx.draw_networkx_nodes(G, pos, nodelist=nodelist, node_color=style["color"], node_size=style["size"], ax=ax, edgecolors="black")
 
         # ラベル描画
         labels = {n: d.get("label", "") for n, d in G.nodes(data=True)}
+        labels.update((key, f"R{key[1]+1}") for key in by_style["reagent_node"])
         nx.draw_networkx_labels(G, pos, labels=labels, **self.STYLE_CONFIG["font"], ax=ax)
         
         # エッジ描画
+        # 候補エッジ・試薬エッジは数千本になり得るため、種類ごとに1つの LineCollection で描く。
+        # 向きが重要な必須エッジ (本数は少ない) のみ矢印付きで描画する。
         for edge_type in ["default", "potential", "reagent"]:
-            edgelist = [(u, v) for u, v, d in G.edges(data=True) if d.get("type") == edge_type]
+            edgelist = edgelists[edge_type]
             if not edgelist: continue
             
             style = self.STYLE_CONFIG[f"edge_{edge_type}"]
-            connectionstyle = "arc3,rad=0.1"
-            if edge_type == "reagent": connectionstyle = "arc3,rad=0.0"
-            
-            nx.draw_networkx_edges(
-                G, pos, edgelist=edgelist,
-                edge_color=style["color"],
-                width=style["width"],
-                style=style["style"],
-                alpha=style.get("alpha", 1.0),
-                arrowsize=20,
-                connectionstyle=connectionstyle,
-                ax=ax
-            )
+            if edge_type == "default":
+                nx.draw_networkx_edges(
+                    G, pos, edgelist=edgelist,
+                    edge_color=style["color"],
+                    width=style["width"],
+                    style=style["style"],
+                    alpha=style.get("alpha", 1.0),
+                    arrowsize=20,
+                    connectionstyle="arc3,rad=0.1",
+                    ax=ax
+                )
+            else:
+                segments = [(pos[u], pos[v]) for u, v in edgelist]
+                ax.add_collection(LineCollection(
+                    segments,
+                    colors=style["color"],
+                    linewidths=style["width"],
+                    linestyles=style["style"],
+                    alpha=style.get("alpha", 1.0),
+                    zorder=0,
+                ))
+                # nx.draw_networkx_edges と同じく、エッジの範囲に 5% の余白を加えて描画範囲を広げる
+                xs = [x for seg in segments for x, _ in seg]
+                ys = [y for seg in segments for _, y in seg]
+                pad_x, pad_y = 0.05 * (max(xs) - min(xs)), 0.05 * (max(ys) - min(ys))
+                ax.update_datalim([(min(xs) - pad_x, min(ys) - pad_y), (max(xs) + pad_x, max(ys) + pad_y)])
+        ax.autoscale_view()
 
         # 凡例
         legend_lines = [
@@ -152,32 +183,147 @@ class StructureVisualizer:
         plt.title(title, fontsize=18)
         plt.axis('off')
         plt.tight_layout()
-        plt.savefig(output_path, dpi=300, bbox_inches="tight")
+        plt.savefig(output_path, dpi=self.PNG_DPI)
         print(f"Graph saved to: {output_path}")
         plt.close()
 
-    def _calculate_node_positions(self, G):
+    def _group_edges(self, G, reagent_keys):
+        """エッジを種類ごとに分類する (試薬エッジは試薬キー -> 親ノード として生成)"""
+        edgelists = {"default": [], "potential": [], "reagent": []}
+        for u, v, d in G.edges(data=True):
+            edge_list = edgelists.get(d.get("type"))
+            if edge_list is not None:
+                edge_list.append((u, v))
+        edgelists["reagent"] = [(key, key[0]) for key in reagent_keys]
+        return edgelists
+
+    def _draw_and_save_svg(self, G, pos, by_style, edgelists, output_path, title):
+        """
+        matplotlib を介さず、エッジを <line>、ノードを <circle> として SVG を直接書き出す。
+        """
+        scale = self.SVG_SCALE
+        margin = 60.0
+        xs = [x for x, _ in pos.values()]
+        ys = [y for _, y in pos.values()]
+        min_x, max_y = min(xs), max(ys)
+        width = (max(xs) - min_x) * scale + 2 * margin
+        height = (max_y - min(ys)) * scale + 2 * margin + 40.0
+
+        # レイアウト座標 -> SVG座標 (y軸は下向き)
+        svg_pos = {
+            n: ((x - min_x) * scale + margin, (max_y - y) * scale + margin + 40.0)
+            for n, (x, y) in pos.items()
+        }
+
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+            f'viewBox="0 0 {width:.1f} {height:.1f}">',
+            '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="6" '
+            'markerHeight="6" orient="auto"><path d="M0,0 L10,5 L0,10 z" fill="black"/></marker></defs>',
+            '<rect width="100%" height="100%" fill="white"/>',
+            f'<text x="{width / 2:.1f}" y="30" font-size="24" text-anchor="middle">{escape(title)}</text>',
+        ]
+
+        # エッジ (種類ごとに1つの <g> にまとめ、スタイルは親要素で指定する)
+        for edge_type in ["potential", "reagent", "default"]:
+            edgelist = edgelists[edge_type]
+            if not edgelist: continue
+            style = self.STYLE_CONFIG[f"edge_{edge_type}"]
+            attrs = f'stroke="{style["color"]}" stroke-width="{style["width"]}" opacity="{style.get("alpha", 1.0)}"'
+            dasharray = self.SVG_DASHARRAY.get(style["style"])
+            if dasharray:
+                attrs += f' stroke-dasharray="{dasharray}"'
+            if edge_type == "default":
+                attrs += ' marker-end="url(#arrow)"'
+            parts.append(f'<g {attrs}>')
+            if edge_type == "default":
+                # 矢印が供給先ノードの円に隠れないよう、終点を円周まで手前に寄せる
+                shrink = self.STYLE_CONFIG["mix_node"]["size"] ** 0.5 / 2
+                for u, v in edgelist:
+                    (x1, y1), (x2, y2) = svg_pos[u], svg_pos[v]
+                    length = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5 or 1.0
+                    x2 -= (x2 - x1) * shrink / length
+                    y2 -= (y2 - y1) * shrink / length
+                    parts.append(f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}"/>')
+            else:
+                parts.extend(
+                    f'<line x1="{svg_pos[u][0]:.1f}" y1="{svg_pos[u][1]:.1f}" '
+                    f'x2="{svg_pos[v][0]:.1f}" y2="{svg_pos[v][1]:.1f}"/>'
+                    for u, v in edgelist
+                )
+            parts.append('</g>')
+
+        # ノードとラベル
+        font = self.STYLE_CONFIG["font"]
+        parts.append(
+            f'<g stroke="black" font-size="{font["font_size"]}" font-weight="{font["font_weight"]}" '
+            f'fill="{font["font_color"]}" text-anchor="middle">'
+        )
+        for style_key, nodelist in by_style.items():
+            style = self.STYLE_CONFIG[style_key]
+            # matplotlib の node_size (pt^2) を半径に換算する
+            radius = style["size"] ** 0.5 / 2
+            for n in nodelist:
+                if style_key == "reagent_node":
+                    label = f"R{n[1]+1}"
+                else:
+                    label = G.nodes[n].get("label", "")
+                x, y = svg_pos[n]
+                lines = label.split("\n")
+                parts.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{radius:.1f}" fill="{style["color"]}"/>')
+                for i, line in enumerate(lines):
+                    dy = (i - (len(lines) - 1) / 2) * font["font_size"] * 1.2 + font["font_size"] * 0.35
+                    parts.append(f'<text x="{x:.1f}" y="{y + dy:.1f}" stroke="none">{escape(line)}</text>')
+        parts.append('</g>')
+        parts.append('</svg>')
+
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(parts))
+        print(f"Graph saved to: {output_path}")
+
+    def _group_nodes(self, G):
+        """
+        ノードを1パスで分類する。
+        戻り値: (ターゲット -> レベル -> ノードリスト, 描画スタイルキー -> ノードリスト)
+        試薬ノードは Graph に含まれないため、ここで (親ノード名, 試薬番号) のキーとして生成し、
+        親ノードの直下 (level + 0.8) の行に並べる。
+        """
+        reagent_indices = range(self.problem.num_reagents)
+        by_target_level = {}
+        by_style = {"target_node": [], "mix_node": [], "reagent_node": []}
+        for n, d in G.nodes(data=True):
+            if d.get("type") != "mix": continue
+            level = d["level"]
+            rows = by_target_level.setdefault(d["target"], {})
+            rows.setdefault(level, []).append(n)
+
+            reagent_keys = [(n, r_idx) for r_idx in reagent_indices]
+            if reagent_keys:
+                rows.setdefault(level + 0.8, []).extend(reagent_keys)
+                by_style["reagent_node"].extend(reagent_keys)
+            by_style["target_node" if level == 0 else "mix_node"].append(n)
+        return by_target_level, by_style
+
+    def _calculate_node_positions(self, G, by_target_level=None):
+        if by_target_level is None:
+            by_target_level, _ = self._group_nodes(G)
+
         pos = {}
-        targets = sorted({d["target"] for n, d in G.nodes(data=True) if d.get("target") is not None})
         current_x_offset = 0.0
+        x_gap, y_gap = self.LAYOUT_CONFIG["x_gap"], self.LAYOUT_CONFIG["y_gap"]
 
-        for target_idx in targets:
-            sub_nodes = [n for n, d in G.nodes(data=True) if d.get("target") == target_idx]
-            if not sub_nodes: continue
-            
-            levels = sorted({G.nodes[n]["level"] for n in sub_nodes})
+        for target_idx in sorted(by_target_level):
+            nodes_by_level = by_target_level[target_idx]
             max_width_in_tree = 0
             
-            for level in levels:
-                nodes_at_level = [n for n in sub_nodes if G.nodes[n].get("level") == level]
-                width = (len(nodes_at_level) - 1) * self.LAYOUT_CONFIG["x_gap"]
+            for level in sorted(nodes_by_level):
+                nodes_at_level = nodes_by_level[level]
+                width = (len(nodes_at_level) - 1) * x_gap
                 start_x = current_x_offset - width / 2.0
                 
                 for i, node_name in enumerate(nodes_at_level):
-                    pos[node_name] = (
-                        start_x + i * self.LAYOUT_CONFIG["x_gap"],
-                        -level * self.LAYOUT_CONFIG["y_gap"]
-                    )
+                    pos[node_name] = (start_x + i * x_gap, -level * y_gap)
                 max_width_in_tree = max(max_width_in_tree, width)
             
             current_x_offset += max_width_in_tree + self.LAYOUT_CONFIG["tree_gap"]
@@ -197,8 +343,7 @@ def visualize_structure():
         print("Unsupported mode for visualization.")
         return
 
-    tree_structures = build_dfmm_forest(targets_config)
-    p_values = calculate_p_values_from_structure(tree_structures, targets_config)
+    tree_structures, p_values = build_dfmm_structures(targets_config)
     problem = MTWMProblem(targets_config, tree_structures, p_values)
     
     visualizer = StructureVisualizer(problem, tree_structures)
@@ -215,8 +360,8 @@ def visualize_structure():
     G_full = visualizer.generate_graph(mode="full")
     visualizer.draw_and_save(G_full, full_out, "Full Potential Structure (with Sharing Candidates)")
     
-    basic_edges = G_basic.number_of_edges()
-    full_edges = G_full.number_of_edges()
+    basic_edges = visualizer.count_edges(mode="basic")
+    full_edges = visualizer.count_edges(mode="full")
     print("-" * 50)
     print(f"Visual check completed.")
     print(f"Basic Edges: {basic_edges}")
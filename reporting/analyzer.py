@@ -1,5 +1,7 @@
 # reporting/analyzer.py
 import os
+from itertools import chain
+from utils import write_lines
 
 class PreRunAnalyzer:
     """
@@ -27,78 +29,77 @@ class PreRunAnalyzer:
         """
         # レポートファイルのパスを構築
         filepath = os.path.join(output_dir, "_pre_run_analysis.txt")
-        content = []
-        # 各セクションのコンテンツを構築して結合
-        content.extend(self._build_tree_structure_section())
-        content.append("\n\n" + "="*55 + "\n")
-        content.extend(self._build_p_values_section())
-        content.append("\n\n" + "="*55 + "\n")
-        content.extend(self._build_sharing_potential_section())
+        separator = "\n\n" + "="*55 + "\n"
+        # 各セクションは行を1つずつ生成するジェネレータで、リストに溜めずにそのまま書き出す
+        # (セクション3は候補エッジ数に比例して大きくなるため)
+        content = chain(
+            self._build_tree_structure_section(), [separator],
+            self._build_p_values_section(), [separator],
+            self._build_sharing_potential_section(),
+        )
 
         try:
             # ファイルに書き込み
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(content))
+            # 行単位で書き出すため、大きめのバッファでシステムコールをまとめる
+            with open(filepath, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                write_lines(f, content)
             print(f"Pre-run analysis report saved to: {filepath}")
         except IOError as e:
             # エラーハンドリング
             print(f"Error saving pre-run analysis report: {e}")
 
     def _build_tree_structure_section(self):
-        """セクション1: DFMMによって構築されたツリーの接続情報レポートを構築する。"""
-        content = ["--- Section 1: Generated Tree Structures (Node Connections) ---"]
+        """セクション1: DFMMによって構築されたツリーの接続情報レポートの行を生成する。"""
+        yield "--- Section 1: Generated Tree Structures (Node Connections) ---"
         for m, tree in enumerate(self.tree_structures):
             target_info = self.problem.targets_config[m]
-            content.append(f"\n[Target: {target_info['name']}] (Factors: {target_info['factors']})")
+            yield f"\n[Target: {target_info['name']}] (Factors: {target_info['factors']})"
             if not tree:
-                content.append("  No nodes generated for this target.")
+                yield "  No nodes generated for this target."
                 continue
 
-            # ノードIDでソートして、表示順を安定させる
-            sorted_nodes = sorted(tree.items())
-            for node_id, node_data in sorted_nodes:
-                level, k = node_id
+            # ノードID (レベル, ノード番号) の昇順で表示する (forest の並びがこの順なのでソート不要)
+            for level, k in self._sorted_node_ids(m):
+                node_data = tree[(level, k)]
                 # 子ノードの情報を文字列にフォーマット
                 children_str = ", ".join([f"v_{c[0]}_{c[1]}" for c in sorted(node_data['children'])])
-                content.append(f"  Node v_m{m}_l{level}_k{k} <-- [{children_str if children_str else 'Reagents Only'}]")
-        return content
+                yield f"  Node v_m{m}_l{level}_k{k} <-- [{children_str if children_str else 'Reagents Only'}]"
 
     def _build_p_values_section(self):
-        """セクション2: 計算された各ノードのP値の検証レポートを構築する。"""
-        content = ["--- Section 2: Calculated P-values per Node ---"]
+        """セクション2: 計算された各ノードのP値の検証レポートの行を生成する。"""
+        yield "--- Section 2: Calculated P-values per Node ---"
         for m, p_tree in enumerate(self.problem.p_values):
             target_info = self.problem.targets_config[m]
-            content.append(f"\n[Target: {target_info['name']}] (Ratios: {target_info['ratios']}, Factors: {target_info['factors']})")
+            yield f"\n[Target: {target_info['name']}] (Ratios: {target_info['ratios']}, Factors: {target_info['factors']})"
             if not p_tree:
-                content.append("  No nodes generated for this target.")
+                yield "  No nodes generated for this target."
                 continue
-            # ノードIDでソート
-            sorted_nodes = sorted(p_tree.items())
-            for node_id, p_value in sorted_nodes:
-                level, k = node_id
-                content.append(f"  Node v_m{m}_l{level}_k{k}: P = {p_value}")
-        return content
+            # ノードIDの昇順で表示する
+            for level, k in self._sorted_node_ids(m):
+                yield f"  Node v_m{m}_l{level}_k{k}: P = {p_tree[(level, k)]}"
 
     def _build_sharing_potential_section(self):
-        """セクション3: 共有可能性があるノード間の接続レポートを構築する。"""
-        content = ["--- Section 3: Potential Sharing Connections (with P-values for validation) ---"]
+        """セクション3: 共有可能性があるノード間の接続レポートの行を生成する。"""
+        yield "--- Section 3: Potential Sharing Connections (with P-values for validation) ---"
         if not self.problem.potential_sources_map:
-            content.append("\nNo potential sharing connections were found.")
-            return content
+            yield "\nNo potential sharing connections were found."
+            return
 
-        # 供給先ノードでソートして表示
-        sorted_destinations = sorted(self.problem.potential_sources_map.keys())
-        for dest_node in sorted_destinations:
-            sources = self.problem.potential_sources_map[dest_node]
+        # 供給先ノードの (m, l, k) 昇順で表示する
+        # (potential_sources_map はこの順に構築されるため、ソートは不要)
+        for dest_node, sources in self.problem.potential_sources_map.items():
             m_dst, l_dst, k_dst = dest_node
             p_dst = self.problem.p_values[m_dst].get((l_dst, k_dst), 'N/A')
             dest_name = f"v_m{m_dst}_l{l_dst}_k{k_dst}"
 
             if sources:
-                content.append(f"\nNode {dest_name} (P={p_dst}) can potentially receive from:")
+                yield f"\nNode {dest_name} (P={p_dst}) can potentially receive from:"
                 # 供給元とそのP値をリストアップ
                 for m_src, l_src, k_src in sources:
                     p_src = self.problem.p_values[m_src].get((l_src, k_src), 'N/A')
                     src_name = f"v_m{m_src}_l{l_src}_k{k_src}"
-                    content.append(f"  -> {src_name} (P={p_src})")
-        return content
\ No newline at end of file
+                    yield f"  -> {src_name} (P={p_src})"
+
+    def _sorted_node_ids(self, m):
+        """ターゲット m のノードID (レベル, ノード番号) を昇順に返す (forest はレベル昇順・ノード番号順に並ぶ)"""
+        return [(level, k) for level, nodes in self.problem.forest[m].items() for k in range(len(nodes))]
@@ -1,6 +1,7 @@
 # reporting/reporter.py
 import os
 from .visualizer import SolutionVisualizer
+from utils import write_lines
 from utils.config_loader import Config
 
 class SolutionReporter:
@@ -50,56 +51,58 @@ class SolutionReporter:
         try:
             with open(filepath, "w", encoding="utf-8") as f:
                 content = self._build_summary_file_content(results, min_value, elapsed_time, output_dir)
-                f.write("\n".join(content))
+                write_lines(f, content)
             print(f"\nResults summary saved to: {filepath}")
         except IOError as e:
             print(f"\nError saving results: {e}")
 
     def _build_summary_file_content(self, results, min_value, elapsed_time, dir_name):
+        """summary.txt の内容を1行ずつ生成する (ノード数に比例する詳細部もリストに溜めない)"""
         objective_str = "Minimum Total Waste" if self.objective_mode == "waste" else "Minimum Operations"
-        content = [
+        yield from (
             "=" * 40, f"Optimization Results for: {os.path.basename(dir_name)}", "=" * 40,
             f"\nSolved in {elapsed_time:.2f} seconds.", "\n--- Target Configuration ---"
-        ]
+        )
         for i, target in enumerate(self.problem.targets_config):
-            content.extend([f"Target {i+1}:", f"  Ratios: {' : '.join(map(str, target['ratios']))}", f"  Factors: {target['factors']}"])
+            yield from (f"Target {i+1}:", f"  Ratios: {' : '.join(map(str, target['ratios']))}", f"  Factors: {target['factors']}")
             
         settings = self.optimization_settings
-        content.extend([
+        yield from (
             "\n--- Optimization Settings ---",
             f"Optimization Mode: {self.objective_mode.upper()}",
             f"Max Sharing Volume: {settings['max_sharing_volume']}",
             f"Max Level Difference: {settings['max_level_diff']}",
             f"Max Mixer Size: {settings['max_mixer_size']}",
             "-" * 28, f"\n{objective_str}: {min_value}"
-        ])
+        )
 
         if results:
-            content.extend([
+            yield from (
                 f"Total mixing operations: {results['total_operations']}",
                 f"Total waste generated: {results['total_waste']}",
                 f"Total reagent units used: {results['total_reagent_units']}",
                 "\n--- Reagent Usage Breakdown ---"
-            ])
+            )
             for t in sorted(results["reagent_usage"].keys()):
-                content.append(f"  Reagent {t+1}: {results['reagent_usage'][t]} unit(s)")
-            content.append("\n\n--- Mixing Process Details ---")
+                yield f"  Reagent {t+1}: {results['reagent_usage'][t]} unit(s)"
+            yield "\n\n--- Mixing Process Details ---"
             
             current_target = -2
             for detail in results["nodes_details"]:
                 if detail["target_id"] != current_target:
                     current_target = detail["target_id"]
                     header = "[Peer Mixing Nodes]" if current_target == -1 else f"[Target {current_target + 1} ({self.problem.targets_config[current_target]['name']})]"
-                    content.append(f"\n{header}")
+                    yield f"\n{header}"
                 
                 level_str = f"{detail['level']}" if isinstance(detail['level'], int) else f"{detail['level']:.1f}"
-                content.extend([
-                    f" Level {level_str}:",
-                    f"   Node {detail['name']}: total_input = {detail['total_input']}",
-                    f"     Ratio composition: {detail['ratio_composition']}",
-                    f"     Mixing: {detail['mixing_str']}" if detail["mixing_str"] else "     (No mixing)"
-                ])
+                mixing_line = f"     Mixing: {detail['mixing_str']}" if detail["mixing_str"] else "     (No mixing)"
+                # ノード1件分の4行は1つの文字列にまとめて出力する (行ごとの文字列生成・書き込みを減らす)
+                yield (
+                    f" Level {level_str}:\n"
+                    f"   Node {detail['name']}: total_input = {detail['total_input']}\n"
+                    f"     Ratio composition: {detail['ratio_composition']}\n"
+                    f"{mixing_line}"
+                )
         
         # [追加] 最後に合計時間を再出力
-        content.append(f"\nTotal Execution Time: {elapsed_time:.2f} seconds")
-        return content
+        yield f"\nTotal Execution Time: {elapsed_time:.2f} seconds"
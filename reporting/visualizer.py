@@ -3,7 +3,7 @@ import os
 import networkx as nx
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
-from utils import create_dfmm_node_name, parse_sharing_key
+from utils import create_dfmm_node_name
 
 class SolutionVisualizer:
     """
@@ -44,36 +44,38 @@ class SolutionVisualizer:
         edge_volumes = {}
         
         # 1. Active DFMM nodes
+        node_wastes = self.model.get_node_wastes()
         for target_idx, tree_vars in enumerate(self.model.forest_vars):
             for level, node_vars_list in tree_vars.items():
                 for node_idx, node_vars in enumerate(node_vars_list):
                     
-                    total_input = self.model._v(node_vars["total_input_var"])
+                    total_input = self.model._v_var(node_vars["total_input_var"])
                     if total_input <= 0: continue
                     
                     node_name = create_dfmm_node_name(target_idx, level, node_idx)
-                    ratio_vals = [self.model._v(r) for r in node_vars["ratio_vars"]]
+                    ratio_vals = [self.model._v_var(r) for r in node_vars["ratio_vars"]]
                     label = f"R{target_idx+1}:[{':'.join(map(str, ratio_vals))}]" if level == 0 else ":".join(map(str, ratio_vals))
                     
                     G.add_node(node_name, label=label, level=level, target=target_idx, type="mix")
-                    self._add_waste_node(G, node_vars, node_name)
+                    self._add_waste_node(G, node_wastes.get((target_idx, level, node_idx), 0), node_name)
                     self._add_reagent_edges(G, edge_volumes, node_vars, node_name, level, target_idx)
                     self._add_sharing_edges(G, edge_volumes, node_vars, node_name, target_idx)
 
         # 2. Peer nodes (MTWMでは現状空だが、拡張性のため維持)
         for i, peer_vars in enumerate(self.model.peer_vars):
-            if self.model._v(peer_vars["total_input_var"]) <= 0: continue
+            if self.model._v_var(peer_vars["total_input_var"]) <= 0: continue
             
             node_name = peer_vars["name"]
-            ratio_vals = [self.model._v(r) for r in peer_vars["ratio_vars"]]
+            ratio_vals = [self.model._v_var(r) for r in peer_vars["ratio_vars"]]
             src_a = self.problem.peer_nodes[i]["source_a_id"]
             level = (src_a[1] + self.problem.peer_nodes[i]["source_b_id"][1]) / 2.0 - 0.5
             
             G.add_node(node_name, label=f"R-Mix\n[{':'.join(map(str, ratio_vals))}]", level=level, target=src_a[0], type="mix_peer")
-            self._add_waste_node(G, peer_vars, node_name)
+            peer_waste_var = peer_vars.get("waste_var")
+            self._add_waste_node(G, self.model._v_var(peer_waste_var) if peer_waste_var is not None else 0, node_name)
             
             for key in ["from_a", "from_b"]:
-                if (val := self.model._v(peer_vars["input_vars"][key])) > 0:
+                if (val := self.model._v_var(peer_vars["input_vars"][key])) > 0:
                     src_id = self.problem.peer_nodes[i]["source_a_id" if key == "from_a" else "source_b_id"]
                     src_name = create_dfmm_node_name(*src_id)
                     G.add_edge(src_name, node_name, volume=val)
@@ -81,17 +83,16 @@ class SolutionVisualizer:
 
         return G, edge_volumes
 
-    def _add_waste_node(self, G, node_vars, parent):
-        # [MODIFIED] waste_var が存在する場合のみ値を取得
-        waste_var = node_vars.get("waste_var")
-        if waste_var is not None and (waste := self.model._v(waste_var)) > 0:
+    def _add_waste_node(self, G, waste, parent):
+        # 廃棄量が正の場合のみ廃棄ノードを追加する
+        if waste > 0:
             wn = f"waste_{parent}"
             G.add_node(wn, level=G.nodes[parent]["level"], target=G.nodes[parent]["target"], type="waste")
             G.add_edge(parent, wn, style="invisible")
 
     def _add_reagent_edges(self, G, edge_volumes, node_vars, dest, level, target):
         for r_idx, r_var in enumerate(node_vars.get("reagent_vars", [])):
-            if (val := self.model._v(r_var)) > 0:
+            if (val := self.model._v_var(r_var)) > 0:
                 rn = f"Reagent_{dest}_t{r_idx}"
                 G.add_node(rn, label=chr(0x2460 + r_idx), level=level+1, target=target, type="reagent")
                 G.add_edge(rn, dest, volume=val)
@@ -100,19 +101,16 @@ class SolutionVisualizer:
     def _add_sharing_edges(self, G, edge_volumes, node_vars, dest, target):
         all_sharing = {**node_vars.get("intra_sharing_vars", {}), **node_vars.get("inter_sharing_vars", {})}
         for key, var in all_sharing.items():
-            if (val := self.model._v(var)) > 0:
+            if (val := self.model._v_var(var)) > 0:
                 src = self._parse_src_name(key, target)
                 G.add_edge(src, dest, volume=val)
                 edge_volumes[(src, dest)] = val
 
     def _parse_src_name(self, key, target):
-        key = key.replace("from_", "")
-        try:
-            parsed = parse_sharing_key(key)
-            if parsed["type"] == "PEER": return self.problem.peer_nodes[parsed["idx"]]["name"]
-            elif parsed["type"] == "DFMM": return create_dfmm_node_name(parsed["target_idx"], parsed["level"], parsed["node_idx"])
-            elif parsed["type"] == "INTRA": return create_dfmm_node_name(target, parsed["level"], parsed["node_idx"])
-        except: return f"Unknown_{key}"
+        # 共有キーは供給元の座標タプル: Intra は (l, k)、Inter は (m, l, k)
+        if len(key) == 2: return create_dfmm_node_name(target, *key)
+        if len(key) == 3: return create_dfmm_node_name(*key)
+        return f"Unknown_{key}"
 
     def _calculate_node_positions(self, G):
         pos = {}
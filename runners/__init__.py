@@ -1,16 +1,53 @@
 # runners/__init__.py
-from .base_runner import BaseRunner
-from .standard_runner import StandardRunner
-from .random_runner import RandomRunner
-from .permutation_runner import PermutationRunner
-from .file_load_runner import FileLoadRunner
-
-RUNNER_MAP = {
-    "auto": StandardRunner,
-    "manual": StandardRunner,
-    "random": RandomRunner,
-    "auto_permutations": PermutationRunner,
-    "file_load": FileLoadRunner,
+import importlib
+from collections.abc import Mapping
+
+# モード名 -> "モジュール:クラス名"
+# 実行されるRunnerだけをインポートするよう、クラスは必要になった時点で読み込む
+RUNNER_PATHS = {
+    "auto": "runners.standard_runner:StandardRunner",
+    "manual": "runners.standard_runner:StandardRunner",
+    "random": "runners.random_runner:RandomRunner",
+    "auto_permutations": "runners.permutation_runner:PermutationRunner",
+    "file_load": "runners.file_load_runner:FileLoadRunner",
+}
+
+_CLASS_PATHS = {
+    "BaseRunner": "runners.base_runner:BaseRunner",
+    **{path.split(":")[1]: path for path in RUNNER_PATHS.values()},
 }
 
-__all__ = ["BaseRunner", "StandardRunner", "RandomRunner", "PermutationRunner", "FileLoadRunner", "RUNNER_MAP"]
\ No newline at end of file
+def _load(path):
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+class _LazyRunnerMap(Mapping):
+    """モード名 -> Runnerクラス の辞書。値を参照した時点で該当モジュールをインポートする"""
+
+    def __init__(self, paths):
+        self._paths = paths
+
+    def __getitem__(self, mode):
+        return _load(self._paths[mode])
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+# 従来どおり RUNNER_MAP[mode] / RUNNER_MAP.get(mode) でクラスが得られる
+RUNNER_MAP = _LazyRunnerMap(RUNNER_PATHS)
+
+def get_runner_class(mode):
+    """モード名に対応するRunnerクラスを返す (未知のモードの場合は None)"""
+    return RUNNER_MAP.get(mode)
+
+def __getattr__(name):
+    # `from runners import StandardRunner` などの従来の参照も遅延インポートで解決する
+    path = _CLASS_PATHS.get(name)
+    if path is None:
+        raise AttributeError(f"module 'runners' has no attribute '{name}'")
+    return _load(path)
+
+__all__ = ["BaseRunner", "StandardRunner", "RandomRunner", "PermutationRunner", "FileLoadRunner", "RUNNER_MAP", "RUNNER_PATHS", "get_runner_class"]
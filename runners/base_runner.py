@@ -1,4 +1,5 @@
 import os
+import itertools
 from abc import ABC, abstractmethod
 from core.execution import ExecutionEngine
 
@@ -10,11 +11,18 @@ class BaseRunner(ABC):
     @abstractmethod
     def run(self): pass
 
-    def _get_unique_output_directory_name(self, config_hash, base_name_prefix):
+    def _create_unique_output_directory(self, config_hash, base_name_prefix, parent_dir=None):
+        """
+        "{prefix}_{hash8}" (既に存在する場合は "_1", "_2", ... を付加) の出力ディレクトリを作成し、そのパスを返す。
+        存在確認と作成を os.mkdir 一回で行うため、複数プロセスが同時に実行しても同じディレクトリを取り合わない。
+        """
         base_name = f"{base_name_prefix}_{config_hash[:8]}"
-        output_dir = base_name
-        counter = 1
-        while os.path.isdir(output_dir):
-            output_dir = f"{base_name}_{counter}"
-            counter += 1
-        return output_dir
\ No newline at end of file
+        if parent_dir:
+            base_name = os.path.join(parent_dir, base_name)
+        for counter in itertools.count():
+            output_dir = base_name if counter == 0 else f"{base_name}_{counter}"
+            try:
+                os.mkdir(output_dir)
+                return output_dir
+            except FileExistsError:
+                continue
@@ -1,6 +1,5 @@
 # runners/file_load_runner.py
 import json
-import os
 from .base_runner import BaseRunner
 from utils.helpers import generate_config_hash
 from reporting import save_comparison_summary, save_run_results_to_json, save_run_results_to_text
@@ -22,8 +21,7 @@ class FileLoadRunner(BaseRunner):
             raise RuntimeError(f"Error loading config: {e}")
 
         print(f"Loaded {len(targets_configs)} patterns.")
-        base_output_dir = self._get_unique_output_directory_name(self.config.RUN_NAME, self.config.RUN_NAME + "_comparison")
-        os.makedirs(base_output_dir, exist_ok=True)
+        base_output_dir = self._create_unique_output_directory(self.config.RUN_NAME, self.config.RUN_NAME + "_comparison")
         print(f"Results will be saved under: '{base_output_dir}/'")
 
         all_results = []
@@ -34,7 +32,7 @@ class FileLoadRunner(BaseRunner):
 
             base_run_name = f"{run_name}_loaded"
             config_hash = generate_config_hash(targets, self.config.OPTIMIZATION_MODE, base_run_name)
-            output_dir = os.path.join(base_output_dir, self._get_unique_output_directory_name(config_hash, base_run_name))
+            output_dir = self._create_unique_output_directory(config_hash, base_run_name, parent_dir=base_output_dir)
 
             final_val, exec_time, ops, reagents, total_waste = self.engine.run_single_optimization(targets, output_dir, self.config.RUN_NAME)
             
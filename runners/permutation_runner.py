@@ -1,10 +1,22 @@
 # runners/permutation_runner.py
 import os
+from concurrent.futures import ProcessPoolExecutor
 from .base_runner import BaseRunner
+from core.execution import ExecutionEngine
+from utils.config_loader import Config
 from utils.helpers import generate_config_hash
 from core.generator import PermutationScenarioGenerator
 from reporting import save_permutation_summary, save_run_results_to_json, save_run_results_to_text
 
+def _init_worker(cpu_workers_per_run):
+    """並列実行の各プロセスで、CP-SATのワーカー数を割り当て分に制限する"""
+    Config.MAX_CPU_WORKERS = cpu_workers_per_run
+
+def _run_permutation(job):
+    """1つの順列シナリオを最適化する (プロセスプールから呼ばれるため、モジュールレベルに置く)"""
+    targets, output_dir, run_name = job
+    return ExecutionEngine(Config).run_single_optimization(targets, output_dir, run_name)
+
 class PermutationRunner(BaseRunner):
     def run(self):
         targets_config_base = self.config.get_targets_config()
@@ -12,24 +24,22 @@ class PermutationRunner(BaseRunner):
 
         base_run_name = f"{self.config.RUN_NAME}_permutations"
         config_hash = generate_config_hash(targets_config_base, self.config.OPTIMIZATION_MODE, base_run_name)
-        base_output_dir = self._get_unique_output_directory_name(config_hash, base_run_name)
-        os.makedirs(base_output_dir, exist_ok=True)
+        base_output_dir = self._create_unique_output_directory(config_hash, base_run_name)
         print(f"Results will be saved under: '{base_output_dir}/'")
 
         generator = PermutationScenarioGenerator(self.config)
-        scenarios = generator.generate_permutations(targets_config_base)
-        print(f"Found {len(scenarios)} unique factor permutation combinations.")
+        total_runs = generator.count_permutations(targets_config_base)
+        print(f"Found {total_runs} unique factor permutation combinations.")
 
+        # シナリオは1つずつ生成し、全組み合わせをメモリ上に展開しない
+        jobs = (
+            (scenario['targets'], os.path.join(base_output_dir, scenario['run_name']), scenario['run_name'])
+            for scenario in generator.iter_permutations(targets_config_base)
+        )
         all_run_results = []
 
-        for i, scenario in enumerate(scenarios):
-            run_name = scenario['run_name']
-            targets = scenario['targets']
-            print(f"\n{'='*20} Running Permutation {i+1}/{len(scenarios)} {'='*20}")
-            
-            output_dir = os.path.join(base_output_dir, run_name)
-            final_val, exec_time, ops, reagents, total_waste = self.engine.run_single_optimization(targets, output_dir, run_name)
-            
+        for (targets, _, run_name), result in self._run_jobs(jobs, total_runs):
+            final_val, exec_time, ops, reagents, total_waste = result
             all_run_results.append({
                 'run_name': run_name, 'targets': targets,
                 'final_value': final_val, 'elapsed_time': exec_time,
@@ -39,4 +49,29 @@ class PermutationRunner(BaseRunner):
 
         save_permutation_summary(all_run_results, base_output_dir, self.config.OPTIMIZATION_MODE)
         save_run_results_to_json(all_run_results, base_output_dir)
-        save_run_results_to_text(all_run_results, base_output_dir)
\ No newline at end of file
+        save_run_results_to_text(all_run_results, base_output_dir)
+
+    def _run_jobs(self, jobs, total_runs):
+        """
+        各順列シナリオを実行し、(job, 結果) を jobs と同じ順序で返すイテレータ。
+        PERMUTATION_PARALLEL_RUNS が2以上なら、独立したシナリオを複数プロセスで同時に解く。
+        (CPUワーカー数はプロセス間で分割し、CP-SATのスレッドと過剰に競合しないようにする)
+        """
+        parallel_runs = self.config.PERMUTATION_PARALLEL_RUNS
+        if not parallel_runs or parallel_runs <= 1 or total_runs <= 1:
+            for i, job in enumerate(jobs):
+                print(f"\n{'='*20} Running Permutation {i+1}/{total_runs} {'='*20}")
+                yield job, self.engine.run_single_optimization(*job)
+            return
+
+        # プロセスプールへの投入には全ジョブが必要なので、並列時のみリスト化する
+        jobs = list(jobs)
+        cpu_workers_per_run = max(1, (self.config.MAX_CPU_WORKERS or 8) // parallel_runs)
+        print(f"\nRunning {len(jobs)} permutations on {parallel_runs} processes "
+              f"({cpu_workers_per_run} solver workers each)...")
+        with ProcessPoolExecutor(
+            max_workers=parallel_runs,
+            initializer=_init_worker,
+            initargs=(cpu_workers_per_run,),
+        ) as pool:
+            yield from zip(jobs, pool.map(_run_permutation, jobs))
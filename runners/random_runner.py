@@ -10,8 +10,7 @@ class RandomRunner(BaseRunner):
         print(f"Preparing to run {num_runs} random simulations...")
         
         base_run_name = f"{self.config.RUN_NAME}-random-{num_runs}runs"
-        base_output_dir = self._get_unique_output_directory_name("random", base_run_name)
-        os.makedirs(base_output_dir, exist_ok=True)
+        base_output_dir = self._create_unique_output_directory("random", base_run_name)
         print(f"Results will be saved under: '{base_output_dir}/'")
 
         generator = RandomScenarioGenerator(self.config)
@@ -13,6 +13,6 @@ class StandardRunner(BaseRunner):
             print("Using manually specified factors...")
 
         config_hash = generate_config_hash(targets_config, self.config.OPTIMIZATION_MODE, self.config.RUN_NAME)
-        output_dir = self._get_unique_output_directory_name(config_hash, self.config.RUN_NAME)
+        output_dir = self._create_unique_output_directory(config_hash, self.config.RUN_NAME)
         
         self.engine.run_single_optimization(targets_config, output_dir, self.config.RUN_NAME)
\ No newline at end of file
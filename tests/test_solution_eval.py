@@ -0,0 +1,37 @@
+# tests/test_solution_eval.py
+import unittest
+from ortools.sat.python import cp_model
+from core.solver.solution import OrToolsSolutionModel
+
+class SolutionEvalTest(unittest.TestCase):
+    """OrToolsSolutionModel.eval が solver.Value と同じ値を返すことを確認する"""
+
+    def setUp(self):
+        model = cp_model.CpModel()
+        self.x = model.NewIntVar(0, 10, "x")
+        self.b = model.NewBoolVar("b")
+        model.Add(self.x == 3)
+        model.Add(self.b == 1)
+        self.solver = cp_model.CpSolver()
+        self.assertEqual(self.solver.Solve(model), cp_model.OPTIMAL)
+        self.solution = OrToolsSolutionModel(
+            problem=None, solver=self.solver, variable_map={"x": self.x},
+            forest_vars=[], peer_vars={}, objective_value=0,
+        )
+
+    def test_int_var(self):
+        self.assertEqual(self.solution.eval(self.x), self.solver.Value(self.x))
+
+    def test_linear_expression(self):
+        expr = 2 * self.x + 1
+        self.assertEqual(self.solution.eval(expr), self.solver.Value(expr))
+
+    def test_negated_literal(self):
+        self.assertEqual(self.solution.eval(self.b.Not()), self.solver.Value(self.b.Not()))
+
+    def test_name_and_none(self):
+        self.assertEqual(self.solution.eval("x"), 3)
+        self.assertEqual(self.solution.eval(None), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,12 +3,12 @@ from .config_loader import Config
 from .helpers import (
     generate_config_hash,
     create_dfmm_node_name,
-    parse_sharing_key
+    write_lines
 )
 
 __all__ = [
     "Config",
     "generate_config_hash",
     "create_dfmm_node_name",
-    "parse_sharing_key"
+    "write_lines"
 ]
\ No newline at end of file
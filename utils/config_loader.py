@@ -20,11 +20,16 @@ class Config:
     MAX_CPU_WORKERS = config.MAX_CPU_WORKERS
     MAX_TIME_PER_RUN_SECONDS = config.MAX_TIME_PER_RUN_SECONDS
     ABSOLUTE_GAP_LIMIT = config.ABSOLUTE_GAP_LIMIT
+    PLATEAU_TIMEOUT_SECONDS = config.PLATEAU_TIMEOUT_SECONDS
+    PERMUTATION_PARALLEL_RUNS = config.PERMUTATION_PARALLEL_RUNS
+    PERMUTATION_SKIP_EQUIVALENT_TARGETS = config.PERMUTATION_SKIP_EQUIVALENT_TARGETS
     
     # --- 制約条件 ---
     MAX_SHARING_VOLUME = config.MAX_SHARING_VOLUME
     MAX_LEVEL_DIFF = config.MAX_LEVEL_DIFF
     MAX_MIXER_SIZE = config.MAX_MIXER_SIZE
+    ENABLE_PRODUCT_CHANNELING = config.ENABLE_PRODUCT_CHANNELING
+    ENABLE_SYMMETRY_BREAKING = config.ENABLE_SYMMETRY_BREAKING
 
     # [NEW] 設定の読み込み
     ENABLE_ROLE_BASED_PRUNING = config.ENABLE_ROLE_BASED_PRUNING
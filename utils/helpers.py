@@ -1,7 +1,7 @@
 # utils/helpers.py
 import json
 import hashlib
-import re
+from functools import lru_cache
 
 def generate_config_hash(targets_config, mode, run_name):
     """
@@ -13,40 +13,19 @@ def generate_config_hash(targets_config, mode, run_name):
     hasher.update(full_string.encode('utf-8'))
     return hasher.hexdigest()
 
-def create_dfmm_node_name(target_idx, level, node_idx):
+def write_lines(f, lines):
     """
-    MTWMのノード命名規則 (v_m{}_l{}_k{}) に従ってノード名を生成します。
+    行のイテラブルを改行区切りでファイルに書き出します。
+    '\n'.join(lines) を書き込むのと同じ出力ですが、全行を連結した文字列をメモリ上に作りません。
     """
-    return f"v_m{target_idx}_l{level}_k{node_idx}"
+    lines = iter(lines)
+    f.write(next(lines, ""))
+    f.writelines("\n" + line for line in lines)
 
-def parse_sharing_key(key_str_no_prefix):
+@lru_cache(maxsize=None)
+def create_dfmm_node_name(target_idx, level, node_idx):
     """
-    共有キー文字列 ('from_' を除いた部分) を解析し、
-    共有タイプ (INTRA/DFMM) とインデックス情報を返します。
-    
-    MTWMのキー形式:
-      - Intra: l{level}k{node_idx}
-      - Inter: m{target}_l{level}k{node_idx}
+    MTWMのノード命名規則 (v_m{}_l{}_k{}) に従ってノード名を生成します。
+    同じノード名は供給先・供給元として何度も参照されるため、結果をキャッシュします。
     """
-    # Inter-sharing (starts with 'm') -> DFMM
-    if key_str_no_prefix.startswith('m'):
-        match = re.match(r"m(\d+)_l(\d+)k(\d+)", key_str_no_prefix)
-        if match:
-            return {
-                "type": "DFMM",
-                "target_idx": int(match.group(1)),
-                "level": int(match.group(2)),
-                "node_idx": int(match.group(3)),
-            }
-            
-    # Intra-sharing (starts with 'l') -> INTRA
-    elif key_str_no_prefix.startswith('l'):
-        match = re.match(r"l(\d+)k(\d+)", key_str_no_prefix)
-        if match:
-            return {
-                "type": "INTRA",
-                "level": int(match.group(1)),
-                "node_idx": int(match.group(2)),
-            }
-
-    raise ValueError(f"Unknown sharing key format: {key_str_no_prefix}")
\ No newline at end of file
+    return f"v_m{target_idx}_l{level}_k{node_idx}"